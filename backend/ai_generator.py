@@ -1,191 +1,621 @@
-from typing import Any, Dict, List, Optional
-
-import openai
-
-
-class AIGenerator:
-    """Handles interactions with Anthropic's Claude API for generating responses"""
-
-    # Static system prompt template for sequential function calling
-    SYSTEM_PROMPT_TEMPLATE = """You are an AI assistant specialized in course materials and educational content with access to comprehensive functions for course information.
-
-Available Functions:
-1. **search_course_content**: Use for questions about specific course content, lessons, or detailed educational materials
-2. **get_course_outline**: Use for questions asking for course outlines, lesson lists, course structure, or "what's in" a course
-
-Multi-Round Function Usage:
-- **You can make up to {max_tool_rounds} separate function calls** to gather comprehensive information
-- **Sequential reasoning**: Use results from first function call to inform subsequent function calls
-- **Strategic approach**: Get overview first (outline), then detailed content (search), or compare multiple sources
-- **Synthesize all results**: Combine information from multiple rounds into comprehensive answers
-
-Examples of effective multi-round usage:
-- Round 1: Get course outline → Round 2: Search specific lesson content mentioned in outline
-- Round 1: Broad topic search → Round 2: Refined search in specific course/lesson based on initial results  
-- Round 1: Search course A for topic → Round 2: Search course B for same topic to compare
-- Round 1: Get course outline to find relevant lessons → Round 2: Search those specific lessons
-
-Function Selection Guidelines:
-- **Course outline queries** (outline, syllabus, lesson list, course structure): Use get_course_outline function
-- **Content queries** (specific topics, lesson details, explanations): Use search_course_content function
-- **Comparison queries**: Use multiple searches or outlines as needed
-- **Complex questions**: Break down into multiple function calls for thorough coverage
-
-For Course Outline Responses:
-- Always include the course title, instructor, and course link when available
-- List all lessons with their numbers and titles
-- Present information clearly and completely from the function results
-
-Response Protocol:
-- **General knowledge questions**: Answer using existing knowledge without using functions
-- **Course-specific questions**: Use appropriate functions across multiple rounds if needed
-- **Complex queries**: Don't hesitate to use multiple function calls for comprehensive answers
-- **No meta-commentary**:
- - Provide direct answers only — no reasoning process, search explanations, or question-type analysis
- - Do not mention "based on the search results", "using functions", or "in my first/second search"
-
-All responses must be:
-1. **Comprehensive** - Include all relevant information gathered from function results
-2. **Educational** - Maintain instructional value
-3. **Clear** - Use accessible language  
-4. **Well-synthesized** - Combine multiple function results seamlessly
-5. **Example-supported** - Include relevant examples when they aid understanding
-
-Provide only the direct answer to what was asked, incorporating all gathered information.
-
-{conversation_context}"""
-
-    def __init__(self, api_key: str, model: str, base_url: str = None):
-        self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
-        self.model = model
-
-        # Pre-build base API parameters
-        self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
-
-    def generate_response(
-        self,
-        query: str,
-        conversation_history: Optional[str] = None,
-        tools: Optional[List] = None,
-        tool_manager=None,
-        max_tool_rounds: int = 2,
-    ) -> str:
-        """
-        Generate AI response with support for sequential function calling.
-
-        Args:
-            query: The user's question or request
-            conversation_history: Previous messages for context
-            tools: Available functions the AI can use
-            tool_manager: Manager to execute functions
-            max_tool_rounds: Maximum number of function execution rounds (default 2)
-
-        Returns:
-            Generated response as string
-        """
-
-        # Build system content with function round information
-        system_content = self._build_system_content(
-            conversation_history, max_tool_rounds
-        )
-
-        # Initialize conversation with system and user messages
-        messages = [
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": query},
-        ]
-
-        # Sequential function execution loop
-        for round_num in range(1, max_tool_rounds + 1):
-            # Make API call with functions available
-            response = self._make_api_call(messages, tools)
-
-            # Check if tools are requested
-            if response.choices[0].finish_reason != "tool_calls":
-                # GPT provided direct response, no tools needed
-                return response.choices[0].message.content
-
-            # Verify function manager is available
-            if not tool_manager:
-                return "Function use requested but no tool manager available"
-
-            # Add GPT's response (with tool calls) to conversation
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": response.choices[0].message.content,
-                    "tool_calls": response.choices[0].message.tool_calls,
-                }
-            )
-
-            # Execute tools and add results to conversation
-            tool_results = self._execute_tools(response, tool_manager)
-            messages.extend(tool_results)
-
-        # After max rounds, make final API call without tools
-        final_response = self._make_api_call(messages, functions=None)
-        return final_response.choices[0].message.content
-
-    def _build_system_content(
-        self, conversation_history: Optional[str], max_tool_rounds: int
-    ) -> str:
-        """Build system prompt with conversation history and tool round information"""
-        conversation_context = (
-            f"\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else ""
-        )
-
-        return self.SYSTEM_PROMPT_TEMPLATE.format(
-            max_tool_rounds=max_tool_rounds, conversation_context=conversation_context
-        )
-
-    def _make_api_call(
-        self, messages: List[Dict[str, Any]], functions: Optional[List] = None
-    ):
-        """Make single API call with error handling"""
-        api_params = {**self.base_params, "messages": messages}
-
-        # Add tools if provided (OpenAI now uses tools instead of functions)
-        if functions:
-            # Convert function definitions to tool format
-            tools = []
-            for func in functions:
-                tools.append({"type": "function", "function": func})
-            api_params["tools"] = tools
-            api_params["tool_choice"] = "auto"
-
-        try:
-            return self.client.chat.completions.create(**api_params)
-        except Exception as e:
-            raise RuntimeError(f"API call failed: {str(e)}")
-
-    def _execute_tools(self, response, tool_manager) -> List[Dict[str, Any]]:
-        """Execute tool calls from response and return formatted results"""
-        tool_results = []
-
-        for tool_call in response.choices[0].message.tool_calls:
-            try:
-                import json
-
-                # Parse tool arguments
-                arguments = json.loads(tool_call.function.arguments)
-
-                # Execute the tool
-                result = tool_manager.execute_tool(tool_call.function.name, **arguments)
-
-                # Add tool result message
-                tool_results.append(
-                    {"role": "tool", "tool_call_id": tool_call.id, "content": result}
-                )
-            except Exception as e:
-                # Handle tool execution errors gracefully
-                tool_results.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": f"Tool execution error: {str(e)}",
-                    }
-                )
-
-        return tool_results
+import asyncio
+import functools
+import hashlib
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+import httpx
+import openai
+import orjson
+from openai.types.chat.chat_completion_message_function_tool_call import (
+    ChatCompletionMessageFunctionToolCall,
+    Function,
+)
+from response_cache import ResponseCache
+
+# Shared connection pool so every client reuses warm keep-alive connections.
+# Opened by AIGenerator.open() on app startup; pooled connections belong to the
+# event loop that made them, so it must not outlive that loop.
+_shared_http: Optional[httpx.AsyncClient] = None
+
+
+class AIGenerator:
+    """Handles interactions with Anthropic's Claude API for generating responses"""
+
+    # Static system prompt template for sequential function calling
+    SYSTEM_PROMPT_TEMPLATE = """You are an AI assistant specialized in course materials and educational content with access to comprehensive functions for course information.
+
+Available Functions:
+1. **search_course_content**: Use for questions about specific course content, lessons, or detailed educational materials
+2. **get_course_outline**: Use for questions asking for course outlines, lesson lists, course structure, or "what's in" a course
+
+Multi-Round Function Usage:
+- **You can make up to {max_tool_rounds} separate function calls** to gather comprehensive information
+- **Sequential reasoning**: Use results from first function call to inform subsequent function calls
+- **Strategic approach**: Get overview first (outline), then detailed content (search), or compare multiple sources
+- **Synthesize all results**: Combine information from multiple rounds into comprehensive answers
+
+Examples of effective multi-round usage:
+- Round 1: Get course outline → Round 2: Search specific lesson content mentioned in outline
+- Round 1: Broad topic search → Round 2: Refined search in specific course/lesson based on initial results  
+- Round 1: Search course A for topic → Round 2: Search course B for same topic to compare
+- Round 1: Get course outline to find relevant lessons → Round 2: Search those specific lessons
+
+Function Selection Guidelines:
+- **Course outline queries** (outline, syllabus, lesson list, course structure): Use get_course_outline function
+- **Content queries** (specific topics, lesson details, explanations): Use search_course_content function
+- **Comparison queries**: Use multiple searches or outlines as needed
+- **Complex questions**: Break down into multiple function calls for thorough coverage
+
+For Course Outline Responses:
+- Always include the course title, instructor, and course link when available
+- List all lessons with their numbers and titles
+- Present information clearly and completely from the function results
+
+Response Protocol:
+- **General knowledge questions**: Answer using existing knowledge without using functions
+- **Course-specific questions**: Use appropriate functions across multiple rounds if needed
+- **Complex queries**: Don't hesitate to use multiple function calls for comprehensive answers
+- **No meta-commentary**:
+ - Provide direct answers only — no reasoning process, search explanations, or question-type analysis
+ - Do not mention "based on the search results", "using functions", or "in my first/second search"
+
+All responses must be:
+1. **Comprehensive** - Include all relevant information gathered from function results
+2. **Educational** - Maintain instructional value
+3. **Clear** - Use accessible language  
+4. **Well-synthesized** - Combine multiple function results seamlessly
+5. **Example-supported** - Include relevant examples when they aid understanding
+
+Provide only the direct answer to what was asked, incorporating all gathered information."""
+
+    # Marks the static system prompt block as a cacheable prefix
+    CACHE_CONTROL = {"type": "ephemeral"}
+
+    # Characters of tool output resent each round before older results are dropped
+    TOOL_OUTPUT_BUDGET = 8000
+    TRUNCATED_TOOL_OUTPUT = "[truncated]"
+
+    # Joins answer text streamed in separate rounds
+    ROUND_SEPARATOR = "\n\n"
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: str = None,
+        prompt_cache_control: bool = False,
+        response_cache: Optional[ResponseCache] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._client_http: Optional[httpx.AsyncClient] = None
+        self.model = model
+        self.prompt_cache_control = prompt_cache_control
+        self.response_cache = response_cache
+
+        # Pre-build base API parameters
+        self.temperature = 0
+        self.max_tokens = 800
+        self.base_params = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """OpenAI client over the shared pool, rebuilt whenever the pool is reopened"""
+        if self._client is None or self._client_http is not _shared_http:
+            # Without an open pool the client falls back to its own connections
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, http_client=_shared_http
+            )
+            self._client_http = _shared_http
+        return self._client
+
+    @classmethod
+    def open(cls):
+        """Open the shared HTTP connection pool on application startup"""
+        global _shared_http
+        if _shared_http is None:
+            _shared_http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=50,
+                    keepalive_expiry=30.0,
+                ),
+                timeout=httpx.Timeout(60.0),
+            )
+
+    @classmethod
+    async def close(cls):
+        """Close the shared HTTP connection pool on application shutdown"""
+        global _shared_http
+        if _shared_http is not None:
+            await _shared_http.aclose()
+            _shared_http = None
+
+    async def generate_response(
+        self,
+        query: str,
+        conversation_history: Optional[str] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+        max_tool_rounds: int = 2,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        """
+        Generate AI response with support for sequential function calling.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available functions the AI can use
+            tool_manager: Manager to execute functions
+            max_tool_rounds: Maximum number of function execution rounds (default 2)
+            sources: Optional list that receives the sources of this response's
+                tool calls, in the order the calls were made
+
+        Returns:
+            Generated response as string
+        """
+
+        # Build system content with function round information
+        system_content = self._build_system_content(
+            conversation_history, max_tool_rounds
+        )
+
+        # Initialize conversation with system and user messages
+        messages = [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": query},
+        ]
+
+        # Serve repeated queries from the cache; only safe for deterministic sampling
+        cache_key = self._cache_key(system_content, tools, query)
+        if cache_key:
+            # SQLite is blocking, so keep it off the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached:
+                answer, cached_sources = cached
+                if sources is not None:
+                    sources.extend(cached_sources)
+                return answer
+
+        # Sources are kept with a cached answer, so collect them even if unasked
+        if sources is None:
+            sources = []
+
+        if tools and tool_manager:
+            answer = await self._run_tool_rounds(
+                messages,
+                self._to_api_tools(tools),
+                tool_manager,
+                max_tool_rounds,
+                sources,
+            )
+        else:
+            # Tools can't run without both definitions and a manager
+            answer = await self._generate_single_shot(messages)
+
+        if cache_key and answer:
+            await asyncio.to_thread(self.response_cache.set, cache_key, answer, sources)
+
+        return answer
+
+    async def generate_response_stream(
+        self,
+        query: str,
+        conversation_history: Optional[str] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+        max_tool_rounds: int = 2,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Generate AI response as a stream of text deltas.
+
+        Answer text is yielded as soon as it arrives, and function call
+        fragments are assembled until the round completes. Text that follows
+        a round's first function call is working text, not answer, and is
+        neither yielded nor cached.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available functions the AI can use
+            tool_manager: Manager to execute functions
+            max_tool_rounds: Maximum number of function execution rounds (default 2)
+            sources: Optional list that receives the sources of this response's
+                tool calls, in the order the calls were made
+
+        Yields:
+            Pieces of the generated response as strings
+        """
+        system_content = self._build_system_content(
+            conversation_history, max_tool_rounds
+        )
+        messages = [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": query},
+        ]
+
+        cache_key = self._cache_key(system_content, tools, query)
+        if cache_key:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached:
+                answer, cached_sources = cached
+                if sources is not None:
+                    sources.extend(cached_sources)
+                yield answer
+                return
+
+        if sources is None:
+            sources = []
+        answer_parts: List[str] = []
+        # Tools can't run without both definitions and a manager
+        api_tools = self._to_api_tools(tools) if tool_manager else None
+        async for delta in self._stream_tool_rounds(
+            messages, api_tools, tool_manager, max_tool_rounds, sources, answer_parts
+        ):
+            yield delta
+
+        answer = self.ROUND_SEPARATOR.join(answer_parts)
+        if cache_key and answer:
+            await asyncio.to_thread(self.response_cache.set, cache_key, answer, sources)
+
+    async def _stream_tool_rounds(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List],
+        tool_manager,
+        max_tool_rounds: int,
+        sources: List[Dict[str, Any]],
+        answer_parts: List[str],
+    ) -> AsyncIterator[str]:
+        """Stream the function calling loop, adding each round's answer text to answer_parts"""
+        # Tool results already produced this query, keyed by call signature
+        seen_results: Dict[str, str] = {}
+        repeated_round = False
+
+        # The round after the last tool round is made without functions
+        for round_num in range(1, max_tool_rounds + 2):
+            final_round = round_num > max_tool_rounds or repeated_round
+            content_parts: List[str] = []
+            tool_calls: List[ChatCompletionMessageFunctionToolCall] = []
+            stream = await self._make_api_call(
+                messages, None if final_round else tools, stream=True
+            )
+            round_parts: List[str] = []
+            async for delta in self._collect_stream(stream, content_parts, tool_calls):
+                # Keep text already sent from an earlier round apart from this one
+                if answer_parts and not round_parts:
+                    yield self.ROUND_SEPARATOR
+                round_parts.append(delta)
+                yield delta
+            if round_parts:
+                answer_parts.append("".join(round_parts))
+
+            if not tool_calls:
+                return
+
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "".join(content_parts) or None,
+                    "tool_calls": tool_calls,
+                }
+            )
+            repeated_round = self._all_seen(tool_calls, seen_results)
+            tool_results = await self._execute_tool_calls(
+                tool_calls, tool_manager, seen_results, sources
+            )
+            self._prune_tool_results(messages, tool_results)
+            messages.extend(tool_results)
+
+    async def _collect_stream(
+        self,
+        stream,
+        content_parts: List[str],
+        tool_calls: List[ChatCompletionMessageFunctionToolCall],
+    ) -> AsyncIterator[str]:
+        """Yield answer text deltas from a streamed completion, collecting text and tool calls"""
+        fragments: Dict[int, Dict[str, str]] = {}
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                content_parts.append(delta.content)
+                # Once a round calls functions its text is working text, not answer
+                if not fragments:
+                    yield delta.content
+
+            # Tool call ids and names arrive once; arguments arrive in pieces
+            for fragment in delta.tool_calls or []:
+                call = fragments.setdefault(
+                    fragment.index, {"id": "", "name": "", "arguments": ""}
+                )
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function and fragment.function.name:
+                    call["name"] = fragment.function.name
+                if fragment.function and fragment.function.arguments:
+                    call["arguments"] += fragment.function.arguments
+
+        tool_calls.extend(
+            ChatCompletionMessageFunctionToolCall(
+                id=call["id"],
+                type="function",
+                function=Function(name=call["name"], arguments=call["arguments"]),
+            )
+            for _, call in sorted(fragments.items())
+        )
+
+    def _cache_key(
+        self, system_content: List[Dict[str, Any]], tools: Optional[List], query: str
+    ) -> Optional[str]:
+        """Build the response cache key, or None when responses should not be cached"""
+        if not self.response_cache or self.temperature != 0:
+            return None
+        return ResponseCache.make_key(
+            **self.base_params,
+            system=system_content,
+            tools=[self._plain_schema(tool) for tool in tools or ()],
+            query=query,
+        )
+
+    @classmethod
+    def _plain_schema(cls, value: Any) -> Any:
+        """Copy a tool definition into plain dicts and lists for JSON encoding"""
+        if isinstance(value, Mapping):
+            return {key: cls._plain_schema(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._plain_schema(item) for item in value]
+        return value
+
+    async def _generate_single_shot(self, messages: List[Dict[str, Any]]) -> str:
+        """Answer with one API call and no tools"""
+        response = await self._make_api_call(messages, tools=None)
+        return response.choices[0].message.content
+
+    async def _run_tool_rounds(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List],
+        tool_manager,
+        max_tool_rounds: int,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        """Run the sequential function calling loop, collecting each call's sources"""
+        # Tool results already produced this query, keyed by call signature
+        seen_results: Dict[str, str] = {}
+
+        # Sequential function execution loop
+        for round_num in range(1, max_tool_rounds + 1):
+            # Make API call with functions available
+            response = await self._make_api_call(messages, tools)
+
+            # Check if tools are requested
+            if response.choices[0].finish_reason != "tool_calls":
+                # GPT provided direct response, no tools needed
+                return response.choices[0].message.content
+
+            # Add GPT's response (with tool calls) to conversation
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": response.choices[0].message.content,
+                    "tool_calls": response.choices[0].message.tool_calls,
+                }
+            )
+
+            # A round that only repeats earlier calls won't find anything new
+            repeated_round = self._all_seen(
+                response.choices[0].message.tool_calls, seen_results
+            )
+
+            # Execute tools and add results to conversation
+            tool_results = await self._execute_tools(
+                response, tool_manager, seen_results, sources
+            )
+            self._prune_tool_results(messages, tool_results)
+            messages.extend(tool_results)
+
+            if repeated_round:
+                break
+
+        # After max rounds, make final API call without tools
+        return await self._generate_single_shot(messages)
+
+    def _build_system_content(
+        self, conversation_history: Optional[str], max_tool_rounds: int
+    ) -> List[Dict[str, Any]]:
+        """Build system content blocks: static prompt prefix first, then conversation history"""
+        static_block = {
+            "type": "text",
+            "text": self._static_prompt(max_tool_rounds),
+        }
+        # OpenAI caches long prefixes automatically but rejects cache_control
+        if self.prompt_cache_control:
+            static_block["cache_control"] = self.CACHE_CONTROL
+
+        system_content = [static_block]
+
+        # Dynamic suffix goes after the cached prefix
+        if conversation_history:
+            system_content.append(
+                {
+                    "type": "text",
+                    "text": f"Previous conversation:\n{conversation_history}",
+                }
+            )
+
+        return system_content
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _static_prompt(max_tool_rounds: int) -> str:
+        """Format the system prompt once per round limit; the result is reused verbatim"""
+        return AIGenerator.SYSTEM_PROMPT_TEMPLATE.format(
+            max_tool_rounds=max_tool_rounds
+        )
+
+    @staticmethod
+    def _to_api_tools(functions: Optional[List]) -> Optional[List[Dict[str, Any]]]:
+        """Convert function definitions to tool format once per query"""
+        if not functions:
+            return None
+        return [{"type": "function", "function": func} for func in functions]
+
+    async def _make_api_call(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        stream: bool = False,
+    ):
+        """Make single API call with error handling; tools must already be in tool format"""
+        # Pass parameters directly rather than merging a fresh kwargs dict per call
+        try:
+            return await self.client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                messages=messages,
+                tools=tools or openai.NOT_GIVEN,
+                tool_choice="auto" if tools else openai.NOT_GIVEN,
+                stream=stream,
+            )
+        except Exception as e:
+            raise RuntimeError(f"API call failed: {str(e)}")
+
+    async def _execute_tools(
+        self,
+        response,
+        tool_manager,
+        seen_results: Optional[Dict[str, str]] = None,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Execute tool calls from response concurrently and return results in call order"""
+        return await self._execute_tool_calls(
+            response.choices[0].message.tool_calls, tool_manager, seen_results, sources
+        )
+
+    async def _execute_tool_calls(
+        self,
+        tool_calls,
+        tool_manager,
+        seen_results: Optional[Dict[str, str]] = None,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute tool calls concurrently and return results in call order.
+
+        Calls whose name and arguments match one already in seen_results reuse
+        that result instead of running the tool again. Each call's sources are
+        added to sources, if given, in call order and without duplicates.
+        """
+        if seen_results is None:
+            seen_results = {}
+
+        keys = [self._tool_call_key(tool_call) for tool_call in tool_calls]
+        pending = {
+            key: tool_call
+            for key, tool_call in zip(keys, tool_calls)
+            if key not in seen_results
+        }
+
+        # Tools are blocking (ChromaDB, embeddings), so run them off the event loop
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(self._execute_tool, tool_call, tool_manager)
+                for tool_call in pending.values()
+            )
+        )
+        # gather keeps call order, so sources merge in call order whatever
+        # order the tools finished in
+        for key, (result, call_sources) in zip(pending, results):
+            seen_results[key] = result["content"]
+            if sources is not None:
+                sources.extend(
+                    source for source in call_sources if source not in sources
+                )
+
+        return [
+            {"role": "tool", "tool_call_id": tool_call.id, "content": seen_results[key]}
+            for key, tool_call in zip(keys, tool_calls)
+        ]
+
+    def _prune_tool_results(
+        self, messages: List[Dict[str, Any]], new_results: List[Dict[str, Any]]
+    ):
+        """
+        Truncate earlier tool results so resent tool output stays within budget.
+
+        The oldest results are replaced first; the incoming round is always kept
+        whole, and each tool message keeps its tool_call_id.
+        """
+        budget = self.TOOL_OUTPUT_BUDGET - sum(
+            len(result["content"]) for result in new_results
+        )
+        earlier = [
+            message
+            for message in messages
+            if message.get("role") == "tool"
+            and message["content"] != self.TRUNCATED_TOOL_OUTPUT
+        ]
+        total = sum(len(message["content"]) for message in earlier)
+
+        for message in earlier:
+            if total <= budget:
+                break
+            total -= len(message["content"])
+            message["content"] = self.TRUNCATED_TOOL_OUTPUT
+
+    @staticmethod
+    def _tool_call_key(tool_call) -> str:
+        """Identify a tool call by its name and canonicalized arguments"""
+        arguments = tool_call.function.arguments
+        try:
+            arguments = orjson.dumps(
+                orjson.loads(arguments), option=orjson.OPT_SORT_KEYS
+            ).decode()
+        except orjson.JSONDecodeError:
+            pass
+        return hashlib.blake2b(
+            f"{tool_call.function.name}|{arguments}".encode(), digest_size=16
+        ).hexdigest()
+
+    def _all_seen(self, tool_calls, seen_results: Dict[str, str]) -> bool:
+        """Check whether every tool call repeats one already made this query"""
+        return all(
+            self._tool_call_key(tool_call) in seen_results for tool_call in tool_calls
+        )
+
+    def _execute_tool(
+        self, tool_call, tool_manager
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Execute a single tool call, returning its result message and its sources"""
+        try:
+            # Parse tool arguments
+            arguments = orjson.loads(tool_call.function.arguments)
+
+            # Execute the tool
+            result, sources = tool_manager.execute_tool_with_sources(
+                tool_call.function.name, **arguments
+            )
+
+            # Build tool result message
+            message = {"role": "tool", "tool_call_id": tool_call.id, "content": result}
+            return message, sources
+        except Exception as e:
+            # Handle tool execution errors gracefully
+            message = {
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": f"Tool execution error: {str(e)}",
+            }
+            return message, []
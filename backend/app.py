@@ -3,18 +3,25 @@ import warnings
 warnings.filterwarnings("ignore", message="resource_tracker: There appear to be.*")
 
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
+import orjson
+from ai_generator import AIGenerator
 from config import config
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from rag_system import RAGSystem
 
 # Initialize FastAPI app
-app = FastAPI(title="Course Materials RAG System", root_path="")
+app = FastAPI(
+    title="Course Materials RAG System",
+    root_path="",
+    default_response_class=ORJSONResponse,
+)
 
 # Add trusted host middleware for proxy
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
@@ -63,6 +70,45 @@ class CourseStats(BaseModel):
     course_titles: List[str]
 
 
+def to_source_objects(sources: List[Any]) -> List[SourceObject]:
+    """Convert tool sources to SourceObject format"""
+    source_objects = []
+    for source in sources:
+        if isinstance(source, dict):
+            # New format with display and link
+            source_objects.append(
+                SourceObject(display=source.get("display", ""), link=source.get("link"))
+            )
+        else:
+            # Backward compatibility for string sources
+            source_objects.append(SourceObject(display=str(source)))
+    return source_objects
+
+
+def sse_event(event: Dict[str, Any]) -> bytes:
+    """Frame an event as a server-sent event"""
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
+
+async def sse_stream(rag, query: str, session_id: str) -> AsyncIterator[bytes]:
+    """Stream a RAG query as server-sent events, ending with a done event"""
+    try:
+        async for event in rag.query_stream(query, session_id):
+            if event["type"] == "sources":
+                event = {
+                    "type": "done",
+                    "sources": [
+                        source.model_dump()
+                        for source in to_source_objects(event["sources"])
+                    ],
+                    "session_id": session_id,
+                }
+            yield sse_event(event)
+    except Exception as e:
+        # Headers are already sent, so report failures in-band
+        yield sse_event({"type": "error", "detail": str(e)})
+
+
 # API Endpoints
 
 
@@ -76,29 +122,29 @@ async def query_documents(request: QueryRequest):
             session_id = rag_system.session_manager.create_session()
 
         # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
-
-        # Convert sources to SourceObject format
-        source_objects = []
-        for source in sources:
-            if isinstance(source, dict):
-                # New format with display and link
-                source_objects.append(
-                    SourceObject(
-                        display=source.get("display", ""), link=source.get("link")
-                    )
-                )
-            else:
-                # Backward compatibility for string sources
-                source_objects.append(SourceObject(display=str(source)))
+        answer, sources = await rag_system.query(request.query, session_id)
 
         return QueryResponse(
-            answer=answer, sources=source_objects, session_id=session_id
+            answer=answer, sources=to_source_objects(sources), session_id=session_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """Process a query and stream the response as server-sent events"""
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_id = rag_system.session_manager.create_session()
+
+    return StreamingResponse(
+        sse_stream(rag_system, request.query, session_id),
+        media_type="text/event-stream",
+    )
+
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -114,7 +160,9 @@ async def get_course_stats():
 
 @app.on_event("startup")
 async def startup_event():
-    """Load initial documents on startup"""
+    """Open pooled API connections and load initial documents on startup"""
+    AIGenerator.open()
+
     docs_path = "../docs"
     if os.path.exists(docs_path):
         print("Loading initial documents...")
@@ -127,6 +175,12 @@ async def startup_event():
             print(f"Error loading documents: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled API connections on shutdown"""
+    await AIGenerator.close()
+
+
 import os
 from pathlib import Path
 
@@ -147,5 +201,6 @@ class DevStaticFiles(StaticFiles):
         return response
 
 
-# Serve static files for the frontend
-app.mount("/", DevStaticFiles(directory="../frontend", html=True), name="static")
+# Serve static files for the frontend, found relative to this file
+FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
+app.mount("/", DevStaticFiles(directory=FRONTEND_DIR, html=True), name="static")
@@ -15,6 +15,8 @@ class Config:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    # Tag the static system prompt for caching (Claude-compatible providers only)
+    PROMPT_CACHE_CONTROL: bool = os.getenv("PROMPT_CACHE_CONTROL", "") == "true"
 
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -28,5 +30,14 @@ class Config:
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
+    # Response cache settings. Entries expire after the TTL and are cleared
+    # whenever RAGSystem adds or clears documents, so answers never outlive
+    # the content they cite.
+    # SQLite response cache location, beside this file; empty disables the cache
+    RESPONSE_CACHE_PATH: str = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "response_cache.db"
+    )
+    RESPONSE_CACHE_TTL: int = 3600  # Seconds before a cached response expires
+
 
 config = Config()
@@ -1,9 +1,10 @@
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from ai_generator import AIGenerator
 from document_processor import DocumentProcessor
 from models import Course, CourseChunk, Lesson
+from response_cache import ResponseCache
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
 from session_manager import SessionManager
 from vector_store import VectorStore
@@ -22,8 +23,17 @@ class RAGSystem:
         self.vector_store = VectorStore(
             config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
         )
+        self.response_cache = None
+        if config.RESPONSE_CACHE_PATH:
+            self.response_cache = ResponseCache(
+                config.RESPONSE_CACHE_PATH, config.RESPONSE_CACHE_TTL
+            )
         self.ai_generator = AIGenerator(
-            config.OPENAI_API_KEY, config.OPENAI_MODEL, config.OPENAI_BASE_URL
+            config.OPENAI_API_KEY,
+            config.OPENAI_MODEL,
+            config.OPENAI_BASE_URL,
+            config.PROMPT_CACHE_CONTROL,
+            self.response_cache,
         )
         self.session_manager = SessionManager(config.MAX_HISTORY)
 
@@ -55,6 +65,7 @@ class RAGSystem:
 
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
+            self._clear_response_cache()
 
             return course, len(course_chunks)
         except Exception as e:
@@ -81,6 +92,7 @@ class RAGSystem:
         if clear_existing:
             print("Clearing existing data for fresh rebuild...")
             self.vector_store.clear_all_data()
+            self._clear_response_cache()
 
         if not os.path.exists(folder_path):
             print(f"Folder {folder_path} does not exist")
@@ -117,9 +129,17 @@ class RAGSystem:
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
 
+        if total_courses:
+            self._clear_response_cache()
+
         return total_courses, total_chunks
 
-    def query(
+    def _clear_response_cache(self):
+        """Drop cached answers, which may no longer match the indexed documents"""
+        if self.response_cache:
+            self.response_cache.clear()
+
+    async def query(
         self, query: str, session_id: Optional[str] = None
     ) -> Tuple[str, List[str]]:
         """
@@ -140,20 +160,16 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
 
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
+        # Generate response using AI with tools, collecting this request's sources
+        sources = []
+        response = await self.ai_generator.generate_response(
             query=prompt,
             conversation_history=history,
             tools=self.tool_manager.get_tool_definitions(),
             tool_manager=self.tool_manager,
+            sources=sources,
         )
 
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
-
         # Update conversation history
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
@@ -161,6 +177,46 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
 
+    async def query_stream(
+        self, query: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query, streaming the response as it is generated.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Yields:
+            {"type": "delta", "content": str} events for each piece of the response,
+            then a final {"type": "sources", "sources": list} event
+        """
+        prompt = f"""Answer this question about course materials: {query}"""
+
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+
+        response_parts = []
+        sources = []
+        async for delta in self.ai_generator.generate_response_stream(
+            query=prompt,
+            conversation_history=history,
+            tools=self.tool_manager.get_tool_definitions(),
+            tool_manager=self.tool_manager,
+            sources=sources,
+        ):
+            response_parts.append(delta)
+            yield {"type": "delta", "content": delta}
+
+        # Sources are only complete once every tool round has run
+        if session_id:
+            self.session_manager.add_exchange(
+                session_id, query, "".join(response_parts)
+            )
+
+        yield {"type": "sources", "sources": sources}
+
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
         return {
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ResponseCache:
+    """Exact-match cache for generated responses, stored in SQLite with a TTL"""
+
+    def __init__(self, db_path: str, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                ttl_expires_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """
+        Hash a canonical JSON encoding of the fields that determine a response.
+
+        Fields must already be plain JSON values; anything else raises
+        TypeError rather than being stringified into an unstable key.
+        """
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Tuple of (answer, sources list), or None on a miss or expired entry
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, sources, ttl_expires_at FROM response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            answer, sources, expires_at = row
+            if expires_at <= time.time():
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+        return answer, json.loads(sources)
+
+    def set(self, key: str, answer: str, sources: List[Dict[str, Any]]):
+        """Store a response along with the sources it was built from"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                (key, answer, json.dumps(sources), time.time() + self.ttl_seconds),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Protocol
+from typing import Any, Dict, List, Optional, Protocol, Tuple
 
 from vector_store import SearchResults, VectorStore
 
@@ -17,6 +17,10 @@ class Tool(ABC):
         """Execute the tool with given parameters"""
         pass
 
+    def execute_with_sources(self, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute the tool, returning its result and the sources this call used"""
+        return self.execute(**kwargs), []
+
 
 class CourseSearchTool(Tool):
     """Tool for searching course content with semantic course name matching"""
@@ -67,7 +71,29 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        result, sources = self.execute_with_sources(query, course_name, lesson_number)
+
+        # Store sources for retrieval
+        if sources:
+            self.last_sources = sources
+
+        return result
+
+    def execute_with_sources(
+        self,
+        query: str,
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Execute the search, returning the sources with the result.
+
+        Unlike execute, this leaves last_sources alone, so concurrent calls
+        for different requests can't see each other's sources.
 
+        Returns:
+            Tuple of (formatted search results or error message, sources list)
+        """
         # Use the vector store's unified search interface
         results = self.store.search(
             query=query, course_name=course_name, lesson_number=lesson_number
@@ -75,7 +101,7 @@ class CourseSearchTool(Tool):
 
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
 
         # Handle empty results
         if results.is_empty():
@@ -84,13 +110,15 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
 
         # Format and return results
         return self._format_results(results)
 
-    def _format_results(self, results: SearchResults) -> str:
-        """Format search results with course and lesson context"""
+    def _format_results(
+        self, results: SearchResults
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Format search results with course and lesson context, returning their sources"""
         formatted = []
         sources = []  # Track sources for the UI with links
 
@@ -120,10 +148,7 @@ class CourseSearchTool(Tool):
 
             formatted.append(f"{header}\n{doc}")
 
-        # Store sources for retrieval
-        self.last_sources = sources
-
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 
 class CourseOutlineTool(Tool):
@@ -239,6 +264,15 @@ class ToolManager:
 
         return self.tools[tool_name].execute(**kwargs)
 
+    def execute_tool_with_sources(
+        self, tool_name: str, **kwargs
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a tool by name, returning its result and the sources this call used"""
+        if tool_name not in self.tools:
+            return f"Tool '{tool_name}' not found", []
+
+        return self.tools[tool_name].execute_with_sources(**kwargs)
+
     def get_last_sources(self) -> list:
         """Get sources from the last search operation"""
         # Check all tools for last_sources attribute
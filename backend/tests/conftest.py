@@ -2,18 +2,18 @@
 Pytest configuration and shared fixtures for RAG Chatbot testing
 """
 import pytest
-from unittest.mock import Mock, patch
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock, patch
+from httpx import ASGITransport, AsyncClient
 from fastapi import FastAPI
-import sys
 import os
 import tempfile
+import warnings
 import shutil
+from types import SimpleNamespace
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from .test_fixtures import MockData, MockVectorStore, MockAnthropicClient, MockToolManager, create_mock_config
+from search_tools import CourseSearchTool
+from .test_fixtures import MockData, MockVectorStore, MockToolManager, create_mock_config
 
 @pytest.fixture
 def mock_config():
@@ -35,20 +35,20 @@ def error_vector_store():
     """Fixture providing vector store that returns errors"""
     return MockVectorStore(return_data=False, return_error=True)
 
-@pytest.fixture
-def mock_anthropic_client():
-    """Fixture providing mock Anthropic client without tool use"""
-    return MockAnthropicClient(simulate_tool_use=False, simulate_error=False)
+@pytest.fixture(scope="session")
+def tool_ok():
+    """Fixture providing a search tool over sample results, shared by the session"""
+    return CourseSearchTool(MockVectorStore(return_data=True, return_error=False))
 
-@pytest.fixture
-def mock_anthropic_client_with_tools():
-    """Fixture providing mock Anthropic client with tool use"""
-    return MockAnthropicClient(simulate_tool_use=True, simulate_error=False)
+@pytest.fixture(scope="session")
+def tool_empty():
+    """Fixture providing a search tool over an empty store, shared by the session"""
+    return CourseSearchTool(MockVectorStore(return_data=False, return_error=False))
 
-@pytest.fixture
-def error_anthropic_client():
-    """Fixture providing mock Anthropic client that raises errors"""
-    return MockAnthropicClient(simulate_tool_use=False, simulate_error=True)
+@pytest.fixture(scope="session")
+def tool_err():
+    """Fixture providing a search tool over a failing store, shared by the session"""
+    return CourseSearchTool(MockVectorStore(return_data=False, return_error=True))
 
 @pytest.fixture
 def mock_tool_manager():
@@ -73,11 +73,11 @@ def sample_chunks():
 @pytest.fixture
 def sample_search_results():
     """Fixture providing sample search results"""
-    return MockData.SAMPLE_SEARCH_RESULTS
+    return MockData.fresh_results()
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def temp_docs_dir():
-    """Fixture providing temporary directory with sample documents"""
+    """Fixture providing temporary directory with sample documents, shared by the session"""
     temp_dir = tempfile.mkdtemp()
     
     # Create sample course files
@@ -109,17 +109,49 @@ RAG stands for Retrieval-Augmented Generation."""
     # Cleanup
     shutil.rmtree(temp_dir)
 
-@pytest.fixture
+def configure_mock_rag_system(mock_rag_system):
+    """Apply the default behaviour of the test app's mock RAG system"""
+    mock_rag_system.session_manager.create_session.return_value = "test_session_123"
+    mock_rag_system.query = AsyncMock(return_value=(
+        "This is a test response", 
+        [{"display": "Test Course - Lesson 1", "link": "http://test.com"}]
+    ))
+
+    async def query_stream(query, session_id):
+        for event in [
+            {"type": "delta", "content": "This is a "},
+            {"type": "delta", "content": "test response"},
+            {"type": "sources", "sources": [{"display": "Test Course - Lesson 1", "link": "http://test.com"}]}
+        ]:
+            yield event
+
+    mock_rag_system.query_stream.side_effect = query_stream
+    mock_rag_system.get_course_analytics.return_value = {
+        "total_courses": 2,
+        "course_titles": ["Building Toward Computer Use with Anthropic", "Introduction to RAG Systems"]
+    }
+
+@pytest.fixture(scope="module")
 def test_app():
-    """Fixture providing FastAPI test application without static file mounting"""
-    from fastapi import FastAPI, HTTPException
+    """Fixture providing FastAPI test application without static file mounting, shared per module"""
+    from fastapi import HTTPException
     from fastapi.middleware.cors import CORSMiddleware
     from fastapi.middleware.trustedhost import TrustedHostMiddleware
-    from pydantic import BaseModel
-    from typing import List, Optional
+    from fastapi.responses import ORJSONResponse, StreamingResponse
+    from config import config
+
+    # Importing app builds its RAG system; keep that one off the on-disk cache,
+    # and quiet the deprecation of its startup hooks, which never run here
+    with patch.object(config, "RESPONSE_CACHE_PATH", ""), warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        from app import CourseStats, QueryRequest, QueryResponse, sse_stream, to_source_objects
     
     # Create test app with same endpoints but without static file mounting
-    app = FastAPI(title="Course Materials RAG System - Test", root_path="")
+    app = FastAPI(
+        title="Course Materials RAG System - Test",
+        root_path="",
+        default_response_class=ORJSONResponse,
+    )
     
     # Add middleware
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
@@ -132,64 +164,34 @@ def test_app():
         expose_headers=["*"],
     )
     
-    # Import models (same as in app.py)
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
-
-    class SourceObject(BaseModel):
-        display: str
-        link: Optional[str] = None
-
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[SourceObject]
-        session_id: str
-
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
-    
     # Mock RAG system for testing
     mock_rag_system = Mock()
-    mock_rag_system.session_manager.create_session.return_value = "test_session_123"
-    mock_rag_system.query.return_value = (
-        "This is a test response", 
-        [{"display": "Test Course - Lesson 1", "link": "http://test.com"}]
-    )
-    mock_rag_system.get_course_analytics.return_value = {
-        "total_courses": 2,
-        "course_titles": ["Building Toward Computer Use with Anthropic", "Introduction to RAG Systems"]
-    }
+    configure_mock_rag_system(mock_rag_system)
     
-    # API Endpoints (same logic as app.py)
+    # API Endpoints (same logic as app.py, against the mock RAG system)
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
         try:
-            session_id = request.session_id
-            if not session_id:
-                session_id = mock_rag_system.session_manager.create_session()
-            
-            answer, sources = mock_rag_system.query(request.query, session_id)
+            session_id = request.session_id or mock_rag_system.session_manager.create_session()
             
-            source_objects = []
-            for source in sources:
-                if isinstance(source, dict):
-                    source_objects.append(SourceObject(
-                        display=source.get('display', ''),
-                        link=source.get('link')
-                    ))
-                else:
-                    source_objects.append(SourceObject(display=str(source)))
+            answer, sources = await mock_rag_system.query(request.query, session_id)
             
             return QueryResponse(
                 answer=answer,
-                sources=source_objects,
+                sources=to_source_objects(sources),
                 session_id=session_id
             )
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/api/query/stream")
+    async def query_documents_stream(request: QueryRequest):
+        session_id = request.session_id or mock_rag_system.session_manager.create_session()
+        return StreamingResponse(
+            sse_stream(mock_rag_system, request.query, session_id),
+            media_type="text/event-stream",
+        )
+
     @app.get("/api/courses", response_model=CourseStats)
     async def get_course_stats():
         try:
@@ -210,22 +212,67 @@ def test_app():
     
     return app
 
-@pytest.fixture
-def client(test_app):
-    """Fixture providing FastAPI test client"""
-    return TestClient(test_app)
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def client(test_app):
+    """Fixture providing an async client that calls the test app in-process, shared per module"""
+    transport = ASGITransport(app=test_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as test_client:
+        yield test_client
+
+@pytest.fixture(autouse=True)
+def reset_mock_rag_system(request):
+    """Restore the shared test app's mock RAG system before each test that uses it"""
+    if "test_app" in request.fixturenames:
+        mock_rag_system = request.getfixturevalue("test_app").state.mock_rag_system
+        mock_rag_system.reset_mock(return_value=True, side_effect=True)
+        configure_mock_rag_system(mock_rag_system)
+    yield
+
+def pytest_addoption(parser):
+    """Register the option that enables slow tests"""
+    parser.addoption("--runslow", action="store_true", default=False, help="run tests marked slow")
+
+def pytest_collection_modifyitems(config, items):
+    """Skip slow tests unless --runslow is given"""
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="need --runslow option to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+# Mock external dependencies that might be problematic in tests, once per session
+_SESSION_PATCHES = [
+    patch('chromadb.PersistentClient'),
+    patch('sentence_transformers.SentenceTransformer'),
+]
+
+def pytest_sessionstart(session):
+    """Start the external dependency patches before any test runs"""
+    for patcher in _SESSION_PATCHES:
+        patcher.start()
+
+def pytest_sessionfinish(session, exitstatus):
+    """Stop the external dependency patches after the session"""
+    for patcher in reversed(_SESSION_PATCHES):
+        patcher.stop()
+
+@pytest.fixture(scope="session")
+def external_mocks():
+    """Patch the OpenAI client class for the session, alongside the session ChromaDB patch"""
+    import chromadb
+
+    # chromadb.PersistentClient is already the mock started in pytest_sessionstart
+    with patch('openai.AsyncOpenAI') as mock_openai:
+        mock_openai.return_value.chat.completions.create = AsyncMock()
+        yield SimpleNamespace(chroma=chromadb.PersistentClient, openai=mock_openai)
 
 @pytest.fixture(autouse=True)
 def setup_test_environment(monkeypatch):
     """Auto-applied fixture to set up test environment"""
     # Set test environment variables
-    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-api-key")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-api-key")
     monkeypatch.setenv("CHROMA_PATH", "./test_chroma_db")
-    
-    # Mock external dependencies that might be problematic in tests
-    with patch('chromadb.PersistentClient'):
-        with patch('sentence_transformers.SentenceTransformer'):
-            yield
 
 @pytest.fixture
 def mock_session_manager():
@@ -1,722 +1,800 @@
 """
 Unit tests for AIGenerator
 Tests the AI generation functionality, tool calling, and API interactions
+Tests share no state and can run in parallel:
+    pytest -n auto backend/tests/test_ai_generator.py
 """
 
-import os
-import sys
-import unittest
-from unittest.mock import MagicMock, Mock, patch
-
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import itertools
+import threading
+from types import SimpleNamespace as NS
+from typing import List, NamedTuple, Optional, Tuple
+from unittest.mock import AsyncMock, Mock, patch
 
+import httpx
+import pytest
 from ai_generator import AIGenerator
-from test_fixtures import MockAnthropicClient, MockToolManager, print_test_section
-
-
-class TestAIGenerator(unittest.TestCase):
-    """Unit tests for AIGenerator functionality"""
-
-    def setUp(self):
-        """Set up test environment"""
-        print_test_section("AIGenerator Unit Tests")
-        self.test_api_key = "sk-test-key-12345"
-        self.test_model = "claude-sonnet-4-20250514"
-
-    def test_ai_generator_initialization(self):
-        """Test AIGenerator initialization"""
-        print("\n🔍 Testing AIGenerator initialization...")
-
-        with patch("anthropic.Anthropic") as mock_anthropic:
-            ai_gen = AIGenerator(self.test_api_key, self.test_model)
-
-            # Verify initialization
-            self.assertEqual(ai_gen.model, self.test_model)
-            self.assertIsNotNone(ai_gen.client)
-            self.assertIsNotNone(ai_gen.base_params)
-
-            # Check base parameters
-            self.assertEqual(ai_gen.base_params["model"], self.test_model)
-            self.assertEqual(ai_gen.base_params["temperature"], 0)
-            self.assertEqual(ai_gen.base_params["max_tokens"], 800)
-
-        print("✅ AIGenerator initialization successful")
-        print(f"   - Model: {ai_gen.model}")
-        print(f"   - Temperature: {ai_gen.base_params['temperature']}")
-        print(f"   - Max tokens: {ai_gen.base_params['max_tokens']}")
-
-    def test_system_prompt_content(self):
-        """Test that system prompt template contains expected content"""
-        print("\n🔍 Testing system prompt content...")
-
-        prompt_template = AIGenerator.SYSTEM_PROMPT_TEMPLATE
-
-        # Check for key components
-        self.assertIn("search_course_content", prompt_template)
-        self.assertIn("get_course_outline", prompt_template)
-        self.assertIn("Multi-Round Tool Usage", prompt_template)
-        self.assertIn("Course outline queries", prompt_template)
-        self.assertIn("Content queries", prompt_template)
-        self.assertIn("{max_tool_rounds}", prompt_template)
-        self.assertIn("Sequential reasoning", prompt_template)
-
-        print("✅ System prompt content validated")
-        print(f"   - Prompt template length: {len(prompt_template)}")
-        print(
-            f"   - Contains search tool: {'search_course_content' in prompt_template}"
-        )
-        print(f"   - Contains outline tool: {'get_course_outline' in prompt_template}")
-        print(
-            f"   - Contains sequential features: {'Sequential reasoning' in prompt_template}"
-        )
+from response_cache import ResponseCache
+from test_fixtures import MockToolManager
 
-    @patch("anthropic.Anthropic")
-    def test_generate_response_without_tools(self, mock_anthropic):
-        """Test generate_response without tools (direct response)"""
-        print("\n🔍 Testing generate_response without tools...")
-
-        # Setup mock
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "This is a direct response without tools."
-        mock_response.stop_reason = "end_turn"
-
-        mock_client.messages.create.return_value = mock_response
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        response = ai_gen.generate_response("What is AI?")
-
-        # Verify
-        self.assertEqual(response, "This is a direct response without tools.")
-        mock_client.messages.create.assert_called_once()
-
-        print("✅ Generate response without tools successful")
-        print(f"   - Response: {response}")
-
-    @patch("anthropic.Anthropic")
-    def test_generate_response_with_conversation_history(self, mock_anthropic):
-        """Test generate_response with conversation history"""
-        print("\n🔍 Testing generate_response with conversation history...")
-
-        # Setup mock
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "Response with history context."
-        mock_response.stop_reason = "end_turn"
-
-        mock_client.messages.create.return_value = mock_response
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        response = ai_gen.generate_response(
-            "Follow up question",
-            conversation_history="Previous: What is AI?\nAssistant: AI is artificial intelligence.",
-        )
+pytestmark = pytest.mark.unit
 
-        # Verify call was made
-        mock_client.messages.create.assert_called_once()
-        call_args = mock_client.messages.create.call_args
+TEST_API_KEY = "sk-test-key-12345"
+TEST_MODEL = "gpt-4o-mini"
 
-        # Check that history is included in system prompt
-        self.assertIn("Previous conversation", call_args.kwargs["system"])
 
-        print("✅ Generate response with conversation history successful")
-        print(f"   - Response: {response}")
-        print(
-            f"   - History included in system: {'Previous conversation' in call_args.kwargs['system']}"
-        )
+@pytest.fixture(scope="module", autouse=True)
+def mock_openai():
+    """Patch the OpenAI client class once for every test in the module"""
+    with patch("openai.AsyncOpenAI") as mock:
+        mock.return_value.chat.completions.create = AsyncMock()
+        yield mock
 
-    @patch("anthropic.Anthropic")
-    def test_generate_response_with_tools_no_tool_use(self, mock_anthropic):
-        """Test generate_response with tools available but not used"""
-        print("\n🔍 Testing generate_response with tools (no tool use)...")
-
-        # Setup mock
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "Direct response, no tools needed."
-        mock_response.stop_reason = "end_turn"
-
-        mock_client.messages.create.return_value = mock_response
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "What is machine learning?",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-        )
 
-        # Verify
-        self.assertEqual(response, "Direct response, no tools needed.")
-
-        # Check that tools were provided in API call
-        call_args = mock_client.messages.create.call_args
-        self.assertIn("tools", call_args.kwargs)
-        self.assertIn("tool_choice", call_args.kwargs)
-
-        print("✅ Generate response with tools (no tool use) successful")
-        print(f"   - Response: {response}")
-        print(f"   - Tools provided: {'tools' in call_args.kwargs}")
-
-    @patch("anthropic.Anthropic")
-    def test_generate_response_with_tool_use(self, mock_anthropic):
-        """Test generate_response with tool use"""
-        print("\n🔍 Testing generate_response with tool use...")
-
-        # Setup mocks for tool use workflow
-        mock_client = Mock()
-
-        # First response with tool use
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test query"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Final response after tool execution
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Response based on tool results."
-
-        # Setup call sequence
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "What is covered in the MCP course?",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-        )
+@pytest.fixture(scope="session")
+def tool_defs():
+    """Tool definitions are static, so build them once"""
+    return MockToolManager().get_tool_definitions()
 
-        # Verify
-        self.assertEqual(response, "Response based on tool results.")
-        self.assertEqual(mock_client.messages.create.call_count, 2)
-
-        print("✅ Generate response with tool use successful")
-        print(f"   - Final response: {response}")
-        print(f"   - API calls made: {mock_client.messages.create.call_count}")
-
-    @patch("anthropic.Anthropic")
-    def test_helper_methods_functionality(self, mock_anthropic):
-        """Test the new helper methods functionality"""
-        print("\n🔍 Testing helper methods...")
-
-        # Setup mocks
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-
-        # Test _build_system_content
-        system_content = ai_gen._build_system_content("Previous conversation", 2)
-        self.assertIn("Previous conversation", system_content)
-        self.assertIn("up to 2 separate tool calls", system_content)
-
-        # Test _execute_tools
-        mock_response = Mock()
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_456"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_response.content = [mock_tool_content]
-
-        mock_tool_manager = MockToolManager()
-        tool_results = ai_gen._execute_tools(mock_response, mock_tool_manager)
-
-        self.assertEqual(len(tool_results), 1)
-        self.assertEqual(tool_results[0]["type"], "tool_result")
-        self.assertEqual(tool_results[0]["tool_use_id"], "tool_456")
-
-        print("✅ Helper methods functionality validated")
-        print(
-            f"   - System content includes conversation: {'Previous conversation' in system_content}"
-        )
-        print(f"   - Tool results generated: {len(tool_results)}")
-
-    @patch("anthropic.Anthropic")
-    def test_tool_execution_error_handling(self, mock_anthropic):
-        """Test error handling during tool execution"""
-        print("\n🔍 Testing tool execution error handling...")
-
-        # Setup mocks
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Mock API error
-        mock_client.messages.create.side_effect = Exception("API Error")
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-
-        try:
-            response = ai_gen.generate_response("test query")
-            self.fail("Should have raised an exception")
-        except Exception as e:
-            self.assertIn("API Error", str(e))
-
-        print("✅ Tool execution error handling successful")
-        print(f"   - Exception properly raised")
-
-    @patch("anthropic.Anthropic")
-    def test_multiple_tool_calls(self, mock_anthropic):
-        """Test handling multiple tool calls in one response"""
-        print("\n🔍 Testing multiple tool calls...")
-
-        # Setup mocks
-        mock_client = Mock()
-
-        # Response with multiple tool uses
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-
-        # Create multiple tool use content blocks
-        tool_content_1 = Mock()
-        tool_content_1.type = "tool_use"
-        tool_content_1.id = "tool_1"
-        tool_content_1.name = "search_course_content"
-        tool_content_1.input = {"query": "query 1"}
-
-        tool_content_2 = Mock()
-        tool_content_2.type = "tool_use"
-        tool_content_2.id = "tool_2"
-        tool_content_2.name = "get_course_outline"
-        tool_content_2.input = {"course_title": "Test Course"}
-
-        mock_tool_response.content = [tool_content_1, tool_content_2]
-
-        # Final response
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Multiple tools executed."
-
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "Complex query",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-        )
 
-        # Verify
-        self.assertEqual(response, "Multiple tools executed.")
-
-        print("✅ Multiple tool calls handling successful")
-        print(f"   - Response: {response}")
-
-    @patch("anthropic.Anthropic")
-    def test_tool_manager_error(self, mock_anthropic):
-        """Test handling when tool manager returns error"""
-        print("\n🔍 Testing tool manager error handling...")
-
-        # Setup mocks
-        mock_client = Mock()
-
-        # Tool use response
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Final response
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Tool error handled."
-
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-        mock_anthropic.return_value = mock_client
-
-        # Test with error-returning tool manager
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager(return_error=True)
-
-        response = ai_gen.generate_response(
-            "test query",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-        )
+@pytest.fixture(scope="module")
+def ai_gen(mock_openai):
+    """AIGenerator shared by the module; it holds no per-query state"""
+    return AIGenerator(TEST_API_KEY, TEST_MODEL)
 
-        # Verify
-        self.assertEqual(response, "Tool error handled.")
-
-        print("✅ Tool manager error handling successful")
-        print(f"   - Response: {response}")
-
-    @patch("anthropic.Anthropic")
-    def test_api_parameters_construction(self, mock_anthropic):
-        """Test API parameters are constructed correctly"""
-        print("\n🔍 Testing API parameters construction...")
-
-        # Setup mock
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "Test response."
-        mock_response.stop_reason = "end_turn"
-        mock_client.messages.create.return_value = mock_response
-        mock_anthropic.return_value = mock_client
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "test query",
-            conversation_history="previous context",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-        )
 
-        # Verify API call parameters
-        call_args = mock_client.messages.create.call_args
-        params = call_args.kwargs
-
-        # Check required parameters
-        self.assertIn("model", params)
-        self.assertIn("messages", params)
-        self.assertIn("system", params)
-        self.assertIn("temperature", params)
-        self.assertIn("max_tokens", params)
-        self.assertIn("tools", params)
-        self.assertIn("tool_choice", params)
-
-        # Check values
-        self.assertEqual(params["model"], self.test_model)
-        self.assertEqual(params["temperature"], 0)
-        self.assertEqual(params["max_tokens"], 800)
-        self.assertEqual(len(params["messages"]), 1)
-        self.assertIn("previous context", params["system"])
-
-        print("✅ API parameters construction successful")
-        print(f"   - Model: {params['model']}")
-        print(f"   - Temperature: {params['temperature']}")
-        print(f"   - Tools provided: {len(params['tools'])}")
-        print(f"   - History included: {'previous context' in params['system']}")
-
-    @patch("anthropic.Anthropic")
-    def test_sequential_tool_calling_two_rounds(self, mock_anthropic):
-        """Test full two-round sequential tool calling"""
-        print("\n🔍 Testing sequential tool calling (two rounds)...")
-
-        # Setup mock client
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Round 1: Claude requests first tool
-        mock_response_1 = Mock()
-        mock_response_1.stop_reason = "tool_use"
-        mock_tool_content_1 = Mock()
-        mock_tool_content_1.type = "tool_use"
-        mock_tool_content_1.id = "tool_1"
-        mock_tool_content_1.name = "get_course_outline"
-        mock_tool_content_1.input = {"course_title": "MCP"}
-        mock_response_1.content = [mock_tool_content_1]
-
-        # Round 2: Claude requests second tool
-        mock_response_2 = Mock()
-        mock_response_2.stop_reason = "tool_use"
-        mock_tool_content_2 = Mock()
-        mock_tool_content_2.type = "tool_use"
-        mock_tool_content_2.id = "tool_2"
-        mock_tool_content_2.name = "search_course_content"
-        mock_tool_content_2.input = {"query": "lesson 1", "course_name": "MCP"}
-        mock_response_2.content = [mock_tool_content_2]
-
-        # Final response after 2 rounds
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Complete answer based on both tools"
-
-        # Setup call sequence
-        mock_client.messages.create.side_effect = [
-            mock_response_1,
-            mock_response_2,
-            mock_final_response,
-        ]
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "What's in lesson 1 of the MCP course?",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2,
-        )
+@pytest.fixture(autouse=True)
+def mock_client(mock_openai):
+    """The patched client, with call history and canned responses cleared"""
+    client = mock_openai.return_value
+    client.chat.completions.create.reset_mock(return_value=True, side_effect=True)
+    return client
 
-        # Verify
-        self.assertEqual(response, "Complete answer based on both tools")
-        self.assertEqual(
-            mock_client.messages.create.call_count, 3
-        )  # 2 tool rounds + final
-
-        print("✅ Sequential tool calling (two rounds) successful")
-        print(f"   - API calls made: {mock_client.messages.create.call_count}")
-        print(f"   - Final response: {response}")
-
-    @patch("anthropic.Anthropic")
-    def test_sequential_tool_calling_early_termination(self, mock_anthropic):
-        """Test early termination when Claude provides direct response"""
-        print("\n🔍 Testing sequential tool calling early termination...")
-
-        # Setup mock client
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # First response is direct (no tools)
-        mock_response = Mock()
-        mock_response.stop_reason = "end_turn"
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "Direct response without tools"
-        mock_client.messages.create.return_value = mock_response
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "What is machine learning?",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2,
-        )
 
-        # Verify
-        self.assertEqual(response, "Direct response without tools")
-        self.assertEqual(mock_client.messages.create.call_count, 1)  # Only first call
-
-        print("✅ Sequential tool calling early termination successful")
-        print(f"   - API calls made: {mock_client.messages.create.call_count}")
-
-    @patch("anthropic.Anthropic")
-    def test_max_tool_rounds_enforcement(self, mock_anthropic):
-        """Test that system stops after max rounds even if Claude wants more tools"""
-        print("\n🔍 Testing max tool rounds enforcement...")
-
-        # Setup mock client
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Both rounds request tools
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Final response without tools
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Forced final response after max rounds"
-
-        # Setup sequence: 2 tool responses + forced final
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_tool_response,
-            mock_final_response,
-        ]
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "Complex query requiring multiple searches",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2,
-        )
+@pytest.fixture
+def tool_manager():
+    """Fresh mock tool manager, since tests replace execute_tool"""
+    return MockToolManager()
 
-        # Verify
-        self.assertEqual(response, "Forced final response after max rounds")
-        self.assertEqual(mock_client.messages.create.call_count, 3)  # 2 rounds + final
-
-        print("✅ Max tool rounds enforcement successful")
-        print(f"   - API calls made: {mock_client.messages.create.call_count}")
-
-    @patch("anthropic.Anthropic")
-    def test_tool_execution_error_handling_in_sequence(self, mock_anthropic):
-        """Test handling of tool execution errors during sequential calling"""
-        print("\n🔍 Testing tool execution error handling in sequence...")
-
-        # Setup mock client
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Tool use response
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Final response
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Response with error handled"
-
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-
-        # Test with error-returning tool manager
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager(return_error=True)
-
-        response = ai_gen.generate_response(
-            "test query",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2,
-        )
 
-        # Verify
-        self.assertEqual(response, "Response with error handled")
-        self.assertEqual(mock_client.messages.create.call_count, 2)
-
-        print("✅ Tool execution error handling successful")
-
-    @patch("anthropic.Anthropic")
-    def test_backward_compatibility_single_tool_call(self, mock_anthropic):
-        """Test that existing single tool call behavior still works"""
-        print("\n🔍 Testing backward compatibility...")
-
-        # Setup mock client for single tool call scenario
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Tool use response
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Direct final response (no more tools)
-        mock_final_response = Mock()
-        mock_final_response.stop_reason = "end_turn"
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Single tool call response"
-
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "search query",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            # Default max_tool_rounds=2, but should stop after first round
-        )
+def _completion(finish_reason, content=None, tool_calls=None):
+    """Build a non-streamed completion with a single choice"""
+    message = NS(content=content, tool_calls=tool_calls)
+    return NS(choices=[NS(finish_reason=finish_reason, message=message)])
+
+
+def _final_response(text):
+    """Build a completion that answers directly"""
+    return _completion("stop", content=text)
 
-        # Verify
-        self.assertEqual(response, "Single tool call response")
-        self.assertEqual(mock_client.messages.create.call_count, 2)  # Tool + final
-
-        print("✅ Backward compatibility maintained")
-
-    @patch("anthropic.Anthropic")
-    def test_conversation_context_preserved_across_rounds(self, mock_anthropic):
-        """Test that conversation context is maintained across tool rounds"""
-        print("\n🔍 Testing conversation context preservation...")
-
-        # Setup mock client
-        mock_client = Mock()
-        mock_anthropic.return_value = mock_client
-
-        # Tool response
-        mock_tool_response = Mock()
-        mock_tool_response.stop_reason = "tool_use"
-        mock_tool_content = Mock()
-        mock_tool_content.type = "tool_use"
-        mock_tool_content.id = "tool_123"
-        mock_tool_content.name = "search_course_content"
-        mock_tool_content.input = {"query": "test"}
-        mock_tool_response.content = [mock_tool_content]
-
-        # Final response
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Response with context"
-
-        mock_client.messages.create.side_effect = [
-            mock_tool_response,
-            mock_final_response,
-        ]
-
-        # Test
-        ai_gen = AIGenerator(self.test_api_key, self.test_model)
-        mock_tool_manager = MockToolManager()
-
-        response = ai_gen.generate_response(
-            "follow up question",
-            conversation_history="Previous: What is AI?\nAssistant: AI is artificial intelligence.",
-            tools=mock_tool_manager.get_tool_definitions(),
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2,
-        )
 
-        # Verify that conversation history is included in system prompt
-        first_call_args = mock_client.messages.create.call_args_list[0]
-        system_prompt = first_call_args.kwargs["system"]
-        self.assertIn("Previous conversation", system_prompt)
-        self.assertIn("artificial intelligence", system_prompt)
+def _tool_call(tool_id, name, arguments):
+    """Build a function tool call with JSON-encoded arguments"""
+    return NS(id=tool_id, function=NS(name=name, arguments=arguments))
 
-        print("✅ Conversation context preservation successful")
 
+def _tool_response(*tool_calls):
+    """Build a completion that requests the given tool calls"""
+    return _completion("tool_calls", tool_calls=list(tool_calls))
 
-if __name__ == "__main__":
-    # Run tests with detailed output
-    unittest.main(verbosity=2)
+
+def _stream_chunk(content=None, tool_calls=None):
+    """Build a streamed completion chunk with a single delta"""
+    return NS(choices=[NS(delta=NS(content=content, tool_calls=tool_calls))])
+
+
+def _tool_call_fragment(index, tool_id=None, name=None, arguments=None):
+    """Build a streamed tool call fragment"""
+    return NS(index=index, id=tool_id, function=NS(name=name, arguments=arguments))
+
+
+async def _async_iter(items):
+    """Yield items as an async stream"""
+    for item in items:
+        yield item
+
+
+async def _collect(stream):
+    """Drain an async stream into a list"""
+    return [item async for item in stream]
+
+
+# Canned completions shared across tests; the generator only reads them, and
+# side_effect is given a fresh list per test since it is consumed as it runs
+SEARCH_TEST = _tool_response(
+    _tool_call("call_123", "search_course_content", '{"query": "test"}')
+)
+SEARCH_MCP = _tool_response(
+    _tool_call("call_1", "search_course_content", '{"query": "MCP"}')
+)
+FINAL_MCP = _final_response("MCP is a protocol.")
+
+
+def test_ai_generator_initialization(ai_gen):
+    """Test AIGenerator initialization; request parameters are checked per call"""
+    assert ai_gen.model == TEST_MODEL
+    assert ai_gen.client is not None
+
+
+def test_system_prompt_content():
+    """Test that system prompt template contains expected content"""
+    prompt_template = AIGenerator.SYSTEM_PROMPT_TEMPLATE
+
+    required = (
+        "search_course_content",
+        "get_course_outline",
+        "Multi-Round Function Usage",
+        "Course outline queries",
+        "Content queries",
+        "{max_tool_rounds}",
+        "Sequential reasoning",
+    )
+    missing = [phrase for phrase in required if phrase not in prompt_template]
+    assert not missing, f"System prompt is missing: {missing}"
+
+
+async def test_generate_response_without_tools(ai_gen, mock_client):
+    """Test generate_response without tools (direct response)"""
+    mock_client.chat.completions.create.return_value = _final_response(
+        "This is a direct response without tools."
+    )
+
+    response = await ai_gen.generate_response("What is AI?")
+
+    assert response == "This is a direct response without tools."
+    mock_client.chat.completions.create.assert_called_once()
+
+
+async def test_generate_response_with_conversation_history(ai_gen, mock_client):
+    """Test generate_response with conversation history"""
+    mock_client.chat.completions.create.return_value = _final_response(
+        "Response with history context."
+    )
+
+    await ai_gen.generate_response(
+        "Follow up question",
+        conversation_history="Previous: What is AI?\nAssistant: AI is artificial intelligence.",
+    )
+
+    # History is the dynamic block after the static system prompt
+    messages = mock_client.chat.completions.create.call_args.kwargs["messages"]
+    system_content = messages[0]["content"]
+    assert messages[0]["role"] == "system"
+    assert "Previous conversation" in system_content[1]["text"]
+
+
+async def test_generate_response_with_tools_no_tool_use(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test generate_response with tools available but not used"""
+    mock_client.chat.completions.create.return_value = _final_response(
+        "Direct response, no tools needed."
+    )
+
+    response = await ai_gen.generate_response(
+        "What is machine learning?",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+    )
+
+    assert response == "Direct response, no tools needed."
+    call_kwargs = mock_client.chat.completions.create.call_args.kwargs
+    assert call_kwargs["tools"][0]["type"] == "function"
+    assert call_kwargs["tool_choice"] == "auto"
+
+
+class ToolFlowCase(NamedTuple):
+    """One tool-use scenario: rounds of (name, arguments) calls, then an answer"""
+
+    tool_rounds: List[List[Tuple[str, str]]]
+    return_error: bool
+    tool_exception: Optional[Exception]
+    max_rounds: int
+    expected_text: str
+    expected_tool_content: str
+
+
+_SEARCH = ("search_course_content", '{"query": "test"}')
+_OUTLINE = ("get_course_outline", '{"course_title": "MCP"}')
+_MOCK_RESULTS = "Mock search results from tool execution"
+
+TOOL_FLOW_CASES = [
+    pytest.param(
+        ToolFlowCase([[_SEARCH]], False, None, 2, "Tool answer.", _MOCK_RESULTS),
+        id="single_tool_call",
+    ),
+    pytest.param(
+        ToolFlowCase(
+            [[_SEARCH, _OUTLINE]], False, None, 2, "Both tools.", _MOCK_RESULTS
+        ),
+        id="multiple_tool_calls",
+    ),
+    pytest.param(
+        ToolFlowCase(
+            [[_SEARCH]], True, None, 2, "Error handled.", "Tool execution failed"
+        ),
+        id="tool_manager_error",
+    ),
+    pytest.param(
+        ToolFlowCase(
+            [[_SEARCH]],
+            False,
+            Exception("Search failed"),
+            2,
+            "Exception handled.",
+            "Tool execution error: Search failed",
+        ),
+        id="tool_execution_exception",
+    ),
+    pytest.param(
+        ToolFlowCase(
+            [[_OUTLINE], [_SEARCH]], False, None, 2, "Two rounds.", _MOCK_RESULTS
+        ),
+        id="sequential_two_rounds",
+    ),
+]
+
+
+@pytest.mark.parametrize("case", TOOL_FLOW_CASES)
+async def test_tool_use_flow(case, ai_gen, mock_client, tool_defs):
+    """Test tool rounds followed by a final answer"""
+    tool_manager = MockToolManager(return_error=case.return_error)
+    if case.tool_exception is not None:
+        tool_manager.execute_tool = Mock(side_effect=case.tool_exception)
+
+    # Completions are built as the generator asks for them
+    tool_responses = (
+        _tool_response(
+            *(
+                _tool_call(f"call_{round_num}_{i}", name, arguments)
+                for i, (name, arguments) in enumerate(tool_calls)
+            )
+        )
+        for round_num, tool_calls in enumerate(case.tool_rounds)
+    )
+    mock_client.chat.completions.create.side_effect = itertools.chain(
+        tool_responses, (_final_response(case.expected_text),)
+    )
+
+    response = await ai_gen.generate_response(
+        "test query",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        max_tool_rounds=case.max_rounds,
+    )
+
+    assert response == case.expected_text
+    # One call per tool round plus the final answer
+    calls = mock_client.chat.completions.create.call_args_list
+    assert len(calls) == len(case.tool_rounds) + 1
+
+    # Last round's results are sent back in call order
+    last_round = len(case.tool_rounds) - 1
+    tool_messages = calls[-1].kwargs["messages"][-len(case.tool_rounds[-1]) :]
+    assert [m["tool_call_id"] for m in tool_messages] == [
+        f"call_{last_round}_{i}" for i in range(len(case.tool_rounds[-1]))
+    ]
+    assert all(m["content"] == case.expected_tool_content for m in tool_messages)
+
+
+async def test_helper_methods_functionality(ai_gen, tool_manager):
+    """Test the helper methods for system content and tool execution"""
+    system_content = ai_gen._build_system_content("Previous conversation", 2)
+    assert "up to 2 separate function calls" in system_content[0]["text"]
+    assert "Previous conversation" in system_content[1]["text"]
+
+    tool_results = await ai_gen._execute_tools(SEARCH_TEST, tool_manager)
+
+    assert len(tool_results) == 1
+    assert tool_results[0]["role"] == "tool"
+    assert tool_results[0]["tool_call_id"] == "call_123"
+    assert tool_results[0]["content"] == "Mock search results from tool execution"
+
+
+def test_system_content_static_prefix(ai_gen):
+    """Test that the static prompt block is identical regardless of history"""
+    without_history = ai_gen._build_system_content(None, 2)
+    with_history = ai_gen._build_system_content("User: What is MCP?", 2)
+
+    # Static block comes first and is byte-identical
+    assert len(without_history) == 1
+    assert len(with_history) == 2
+    assert without_history[0] == with_history[0]
+    assert without_history[0]["text"] is with_history[0]["text"]
+    assert "up to 2 separate function calls" in with_history[0]["text"]
+    assert (
+        "up to 3 separate function calls"
+        in ai_gen._build_system_content(None, 3)[0]["text"]
+    )
+    assert "cache_control" not in with_history[0]
+
+    # Conversation history follows as the dynamic suffix
+    assert "Previous conversation" in with_history[1]["text"]
+    assert "What is MCP?" in with_history[1]["text"]
+
+
+def test_system_content_cache_control():
+    """Test that the static prompt block is tagged for prompt caching"""
+    ai_gen = AIGenerator(TEST_API_KEY, TEST_MODEL, prompt_cache_control=True)
+
+    system_content = ai_gen._build_system_content("User: What is MCP?", 2)
+
+    assert system_content[0]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in system_content[1]
+
+
+async def test_clients_share_http_connection_pool(mock_openai):
+    """Test that every AIGenerator reuses the same HTTP connection pool"""
+    AIGenerator.open()
+    try:
+        AIGenerator(TEST_API_KEY, TEST_MODEL).client
+        AIGenerator(TEST_API_KEY, TEST_MODEL).client
+
+        first_pool, second_pool = (
+            call.kwargs["http_client"] for call in mock_openai.call_args_list[-2:]
+        )
+        assert isinstance(first_pool, httpx.AsyncClient)
+        assert first_pool is second_pool
+    finally:
+        await AIGenerator.close()
+
+
+async def test_http_connection_pool_reopens_after_close(mock_openai):
+    """Test that a closed pool is dropped and a later open() starts a fresh one"""
+    ai_gen = AIGenerator(TEST_API_KEY, TEST_MODEL)
+
+    # Each open/close cycle may run on its own event loop
+    for _ in range(2):
+        AIGenerator.open()
+        ai_gen.client
+        pool = mock_openai.call_args.kwargs["http_client"]
+        assert not pool.is_closed
+        await AIGenerator.close()
+        assert pool.is_closed
+
+    # With no open pool the client manages its own connections
+    ai_gen.client
+    assert mock_openai.call_args.kwargs["http_client"] is None
+
+
+async def test_parallel_tool_calls_execute_concurrently(ai_gen, tool_manager):
+    """Test that parallel tool calls run concurrently and keep call order"""
+    # Both calls must be in flight at once to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def execute_tool(tool_name, **kwargs):
+        barrier.wait()
+        return f"{tool_name} results for {kwargs['query']}"
+
+    tool_manager.execute_tool = execute_tool
+
+    response = _tool_response(
+        _tool_call("call_1", "search_course_content", '{"query": "MCP"}'),
+        _tool_call("call_2", "search_course_content", '{"query": "RAG"}'),
+    )
+
+    tool_results = await ai_gen._execute_tools(response, tool_manager)
+
+    assert [result["tool_call_id"] for result in tool_results] == ["call_1", "call_2"]
+    assert tool_results[0]["content"] == "search_course_content results for MCP"
+    assert tool_results[1]["content"] == "search_course_content results for RAG"
+
+
+async def test_tool_sources_collected_per_response(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that a response's tool sources reach the caller's list"""
+    mock_client.chat.completions.create.side_effect = [SEARCH_MCP, FINAL_MCP]
+    sources = []
+
+    await ai_gen.generate_response(
+        "What is MCP?",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        sources=sources,
+    )
+
+    assert sources == tool_manager.last_sources
+
+
+async def test_parallel_tool_sources_merge_in_call_order(ai_gen, tool_manager):
+    """Test that sources from a round merge in call order, not finish order"""
+    second_done = threading.Event()
+    shared = {"display": "MCP Course - Lesson 1", "link": None}
+
+    def execute_tool_with_sources(tool_name, **kwargs):
+        # The first call finishes only after the second has
+        if kwargs["query"] == "MCP":
+            assert second_done.wait(timeout=5)
+            return "MCP results", [{"display": "MCP Course", "link": None}, shared]
+        second_done.set()
+        return "RAG results", [shared, {"display": "RAG Course", "link": None}]
+
+    tool_manager.execute_tool_with_sources = execute_tool_with_sources
+
+    response = _tool_response(
+        _tool_call("call_1", "search_course_content", '{"query": "MCP"}'),
+        _tool_call("call_2", "search_course_content", '{"query": "RAG"}'),
+    )
+    sources = []
+
+    await ai_gen._execute_tools(response, tool_manager, sources=sources)
+
+    assert [source["display"] for source in sources] == [
+        "MCP Course",
+        "MCP Course - Lesson 1",
+        "RAG Course",
+    ]
+
+
+async def test_tool_payload_built_once_per_query(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that every round reuses the same converted tools payload"""
+    mock_client.chat.completions.create.side_effect = [
+        SEARCH_MCP,
+        SEARCH_MCP,
+        FINAL_MCP,
+    ]
+
+    await ai_gen.generate_response(
+        "What is MCP?",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+    )
+
+    calls = mock_client.chat.completions.create.call_args_list
+    assert calls[0].kwargs["tools"][0]["type"] == "function"
+    assert calls[0].kwargs["tools"] is calls[1].kwargs["tools"]
+    assert not calls[2].kwargs["tools"]
+
+
+async def test_repeated_tool_round_short_circuits(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that a round repeating earlier tool calls skips to the final answer"""
+    mock_client.chat.completions.create.side_effect = [
+        _tool_response(
+            _tool_call(
+                "call_1",
+                "search_course_content",
+                '{"query": "MCP", "course_name": "MCP"}',
+            )
+        ),
+        # Same search with arguments in a different order
+        _tool_response(
+            _tool_call(
+                "call_2",
+                "search_course_content",
+                '{"course_name": "MCP", "query": "MCP"}',
+            )
+        ),
+        FINAL_MCP,
+    ]
+    tool_manager.execute_tool = Mock(return_value="MCP course content")
+
+    response = await ai_gen.generate_response(
+        "What is MCP?",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        max_tool_rounds=3,
+    )
+
+    assert response == "MCP is a protocol."
+    tool_manager.execute_tool.assert_called_once()
+
+    # Third call is the final no-tools call, with the reused result in context
+    calls = mock_client.chat.completions.create.call_args_list
+    assert len(calls) == 3
+    assert not calls[2].kwargs["tools"]
+    repeated_result = calls[2].kwargs["messages"][-1]
+    assert repeated_result["tool_call_id"] == "call_2"
+    assert repeated_result["content"] == "MCP course content"
+
+
+def test_prune_tool_results_over_budget(ai_gen):
+    """Test that the oldest tool results are truncated once over budget"""
+    messages = [
+        {"role": "user", "content": "Compare MCP and RAG"},
+        {"role": "tool", "tool_call_id": "call_1", "content": "a" * 3000},
+        {"role": "tool", "tool_call_id": "call_2", "content": "b" * 3000},
+    ]
+    new_results = [{"role": "tool", "tool_call_id": "call_3", "content": "c" * 4000}]
+
+    ai_gen._prune_tool_results(messages, new_results)
+
+    # Only the oldest result is dropped; linkage is kept
+    assert messages[1]["content"] == ai_gen.TRUNCATED_TOOL_OUTPUT
+    assert messages[1]["tool_call_id"] == "call_1"
+    assert messages[2]["content"] == "b" * 3000
+    assert new_results[0]["content"] == "c" * 4000
+    assert messages[0]["content"] == "Compare MCP and RAG"
+
+
+async def test_no_tool_manager_single_shot(ai_gen, mock_client, tool_defs):
+    """Test that tools are not offered when they cannot be executed"""
+    mock_client.chat.completions.create.return_value = _final_response(
+        "AI is artificial intelligence."
+    )
+
+    response = await ai_gen.generate_response("What is AI?", tools=tool_defs)
+
+    assert response == "AI is artificial intelligence."
+    mock_client.chat.completions.create.assert_called_once()
+    call_kwargs = mock_client.chat.completions.create.call_args.kwargs
+    assert not call_kwargs["tools"]
+
+
+async def test_generate_response_stream(ai_gen, mock_client, tool_manager, tool_defs):
+    """Test streaming a tool round followed by a streamed answer"""
+    tool_round = [
+        _stream_chunk(
+            tool_calls=[
+                _tool_call_fragment(0, "call_1", "search_course_content", '{"query": ')
+            ]
+        ),
+        _stream_chunk(tool_calls=[_tool_call_fragment(0, arguments='"MCP"}')]),
+    ]
+    answer_round = [
+        _stream_chunk(content="MCP is "),
+        _stream_chunk(content="a protocol."),
+    ]
+    mock_client.chat.completions.create.side_effect = [
+        _async_iter(tool_round),
+        _async_iter(answer_round),
+    ]
+    tool_manager.execute_tool = Mock(return_value="MCP course content")
+
+    deltas = await _collect(
+        ai_gen.generate_response_stream(
+            "What is MCP?",
+            tools=tool_defs,
+            tool_manager=tool_manager,
+        )
+    )
+
+    assert deltas == ["MCP is ", "a protocol."]
+    tool_manager.execute_tool.assert_called_once_with(
+        "search_course_content", query="MCP"
+    )
+
+    # Assembled tool call and its result are sent back in the second round
+    second_call = mock_client.chat.completions.create.call_args_list[1].kwargs
+    assert second_call["stream"]
+    assistant_message, tool_message = second_call["messages"][-2:]
+    assert assistant_message["tool_calls"][0].id == "call_1"
+    assert assistant_message["tool_calls"][0].function.arguments == '{"query": "MCP"}'
+    assert tool_message["content"] == "MCP course content"
+
+
+async def test_generate_response_stream_skips_tool_round_text(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that text sent after a round's function call is not streamed"""
+    tool_round = [
+        _stream_chunk(
+            tool_calls=[
+                _tool_call_fragment(
+                    0, "call_1", "search_course_content", '{"query": "MCP"}'
+                )
+            ]
+        ),
+        _stream_chunk(content="Searching the course materials..."),
+    ]
+    answer_round = [_stream_chunk(content="MCP is a protocol.")]
+    mock_client.chat.completions.create.side_effect = [
+        _async_iter(tool_round),
+        _async_iter(answer_round),
+    ]
+
+    deltas = await _collect(
+        ai_gen.generate_response_stream(
+            "What is MCP?",
+            tools=tool_defs,
+            tool_manager=tool_manager,
+        )
+    )
+
+    assert deltas == ["MCP is a protocol."]
+
+    # The working text still goes back to the model with its tool call
+    second_call = mock_client.chat.completions.create.call_args_list[1].kwargs
+    assistant_message = second_call["messages"][-2]
+    assert assistant_message["content"] == "Searching the course materials..."
+
+
+async def test_generate_response_stream_empty_answer_not_cached(mock_client):
+    """Test that a stream producing no answer text leaves the cache empty"""
+    cache = ResponseCache(":memory:")
+    ai_gen = AIGenerator(TEST_API_KEY, TEST_MODEL, response_cache=cache)
+    mock_client.chat.completions.create.side_effect = [
+        _async_iter([_stream_chunk()]),
+        _async_iter([_stream_chunk(content="MCP is a protocol.")]),
+    ]
+
+    first = await _collect(ai_gen.generate_response_stream("What is MCP?"))
+    second = await _collect(ai_gen.generate_response_stream("What is MCP?"))
+
+    assert first == []
+    assert second == ["MCP is a protocol."]
+    assert mock_client.chat.completions.create.call_count == 2
+
+
+def test_response_cache_key_serializes_tool_schemas(tool_defs):
+    """Test that read-only tool schemas key the same as their plain dict copies"""
+    ai_gen = AIGenerator(
+        TEST_API_KEY, TEST_MODEL, response_cache=ResponseCache(":memory:")
+    )
+    system_content = ai_gen._build_system_content(None, 2)
+    plain_defs = [
+        {**tool, "input_schema": dict(tool["input_schema"])} for tool in tool_defs
+    ]
+
+    assert ai_gen._cache_key(system_content, tool_defs, "What is MCP?") == (
+        ai_gen._cache_key(system_content, plain_defs, "What is MCP?")
+    )
+
+
+async def test_response_cache_runs_off_event_loop(mock_client):
+    """Test that the blocking SQLite cache is never called on the event loop thread"""
+    mock_client.chat.completions.create.return_value = _final_response("Answer.")
+    cache = ResponseCache(":memory:")
+    calling_threads = []
+    for name in ("get", "set"):
+        method = getattr(cache, name)
+
+        def spy(*args, _method=method):
+            calling_threads.append(threading.current_thread())
+            return _method(*args)
+
+        setattr(cache, name, spy)
+    ai_gen = AIGenerator(TEST_API_KEY, TEST_MODEL, response_cache=cache)
+
+    # The event loop runs the test on the calling thread
+    loop_thread = threading.current_thread()
+    await ai_gen.generate_response("What is AI?")
+
+    assert len(calling_threads) == 2
+    assert loop_thread not in calling_threads
+
+
+async def test_response_cache_hit_skips_api_call(mock_client):
+    """Test that a repeated query is answered from the response cache"""
+    mock_client.chat.completions.create.return_value = _final_response("Cached answer.")
+    ai_gen = AIGenerator(
+        TEST_API_KEY, TEST_MODEL, response_cache=ResponseCache(":memory:")
+    )
+
+    first = await ai_gen.generate_response("What is AI?")
+    second = await ai_gen.generate_response("What is AI?")
+
+    # Only the first call reached the API
+    assert first == "Cached answer."
+    assert second == "Cached answer."
+    mock_client.chat.completions.create.assert_called_once()
+
+
+async def test_response_cache_hit_returns_stored_sources(
+    mock_client, tool_manager, tool_defs
+):
+    """Test that a cache hit restores sources without running any tools"""
+    ai_gen = AIGenerator(
+        TEST_API_KEY, TEST_MODEL, response_cache=ResponseCache(":memory:")
+    )
+    tool_manager.execute_tool = Mock(return_value="MCP course content")
+    mock_client.chat.completions.create.side_effect = [SEARCH_MCP, FINAL_MCP]
+
+    first_sources, second_sources = [], []
+    for sources in (first_sources, second_sources):
+        response = await ai_gen.generate_response(
+            "What is MCP?",
+            tools=tool_defs,
+            tool_manager=tool_manager,
+            sources=sources,
+        )
+        assert response == "MCP is a protocol."
+
+    # The second answer came from the cache, with the first answer's sources
+    tool_manager.execute_tool.assert_called_once()
+    assert mock_client.chat.completions.create.call_count == 2
+    assert second_sources == first_sources == tool_manager.last_sources
+
+
+async def test_api_error_raises(ai_gen, mock_client):
+    """Test that API errors surface as RuntimeError"""
+    mock_client.chat.completions.create.side_effect = Exception("API Error")
+
+    with pytest.raises(RuntimeError, match="API Error"):
+        await ai_gen.generate_response("test query")
+
+
+async def test_api_parameters_construction(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test API parameters are constructed correctly"""
+    mock_client.chat.completions.create.return_value = _final_response("Test response.")
+
+    await ai_gen.generate_response(
+        "test query",
+        conversation_history="previous context",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+    )
+
+    params = mock_client.chat.completions.create.call_args.kwargs
+    assert params["model"] == TEST_MODEL
+    assert params["temperature"] == 0
+    assert params["max_tokens"] == 800
+    assert params["tool_choice"] == "auto"
+    assert len(params["tools"]) == 1
+
+    # System prompt plus the user query
+    assert len(params["messages"]) == 2
+    assert params["messages"][1] == {"role": "user", "content": "test query"}
+    assert "previous context" in params["messages"][0]["content"][1]["text"]
+
+
+async def test_sequential_tool_calling_early_termination(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test early termination when the model provides a direct response"""
+    mock_client.chat.completions.create.return_value = _final_response(
+        "Direct response without tools"
+    )
+
+    response = await ai_gen.generate_response(
+        "What is machine learning?",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        max_tool_rounds=2,
+    )
+
+    assert response == "Direct response without tools"
+    mock_client.chat.completions.create.assert_called_once()
+
+
+async def test_max_tool_rounds_enforcement(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that the loop stops after max rounds even if the model wants more tools"""
+    mock_client.chat.completions.create.side_effect = [
+        SEARCH_TEST,
+        SEARCH_MCP,
+        FINAL_MCP,
+    ]
+
+    response = await ai_gen.generate_response(
+        "Complex query requiring multiple searches",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        max_tool_rounds=2,
+    )
+
+    assert response == "MCP is a protocol."
+    calls = mock_client.chat.completions.create.call_args_list
+    assert len(calls) == 3
+    assert not calls[2].kwargs["tools"]
+
+
+async def test_conversation_context_preserved_across_rounds(
+    ai_gen, mock_client, tool_manager, tool_defs
+):
+    """Test that conversation context is maintained across tool rounds"""
+    mock_client.chat.completions.create.side_effect = [
+        SEARCH_TEST,
+        FINAL_MCP,
+    ]
+
+    await ai_gen.generate_response(
+        "follow up question",
+        conversation_history="Previous: What is AI?\nAssistant: AI is artificial intelligence.",
+        tools=tool_defs,
+        tool_manager=tool_manager,
+        max_tool_rounds=2,
+    )
+
+    # Both rounds carry the same system prompt with the history block
+    for call in mock_client.chat.completions.create.call_args_list:
+        history_block = call.kwargs["messages"][0]["content"][1]["text"]
+        assert "Previous conversation" in history_block
+        assert "artificial intelligence" in history_block
@@ -3,289 +3,266 @@ API endpoint tests for the RAG Chatbot FastAPI application
 """
 import pytest
 import json
-from fastapi import HTTPException
-from unittest.mock import Mock, patch
+from typing import List
+from unittest.mock import patch
+
+from pydantic import BaseModel
+from test_fixtures import SourceSchema
+
+# The shared client fixture lives on the module's event loop
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+# Error details are matched against the raw response body
+RAG_ERROR = b"RAG system error"
+ANALYTICS_ERROR = b"Analytics error"
+
+class QueryResponseSchema(BaseModel):
+    """Expected body of a successful /api/query response"""
+    answer: str
+    sources: List[SourceSchema]
+    session_id: str
+
+class CourseStatsSchema(BaseModel):
+    """Expected body of a successful /api/courses response"""
+    total_courses: int
+    course_titles: List[str]
+
+class RootSchema(BaseModel):
+    """Expected body of the / response"""
+    message: str
+
+def ok_json(response, schema):
+    """Assert a 200 response and validate its raw body against the schema"""
+    assert response.status_code == 200
+    return schema.model_validate_json(response.content)
 
 @pytest.mark.api
 class TestQueryEndpoint:
     """Test cases for /api/query endpoint"""
     
-    def test_query_with_session_id(self, client):
+    async def test_query_with_session_id(self, client):
         """Test query endpoint with provided session ID"""
         request_data = {
             "query": "What is computer automation?",
             "session_id": "existing_session_123"
         }
         
-        response = client.post("/api/query", json=request_data)
+        response = await client.post("/api/query", json=request_data)
         
-        assert response.status_code == 200
-        data = response.json()
-        
-        assert "answer" in data
-        assert "sources" in data
-        assert "session_id" in data
-        assert data["session_id"] == "existing_session_123"
-        assert isinstance(data["sources"], list)
-        
-        # Check source format
-        if data["sources"]:
-            source = data["sources"][0]
-            assert "display" in source
-            assert "link" in source
+        data = ok_json(response, QueryResponseSchema)
+        assert data.session_id == "existing_session_123"
     
-    def test_query_without_session_id(self, client):
+    async def test_query_without_session_id(self, client):
         """Test query endpoint without session ID (should create new session)"""
         request_data = {
             "query": "Tell me about RAG systems"
         }
         
-        response = client.post("/api/query", json=request_data)
+        response = await client.post("/api/query", json=request_data)
         
-        assert response.status_code == 200
-        data = response.json()
-        
-        assert "answer" in data
-        assert "sources" in data
-        assert "session_id" in data
-        assert data["session_id"] == "test_session_123"  # From mock
+        data = ok_json(response, QueryResponseSchema)
+        assert data.session_id == "test_session_123"  # From mock
     
-    def test_query_empty_string(self, client):
+    async def test_query_empty_string(self, client):
         """Test query endpoint with empty query string"""
         request_data = {
             "query": ""
         }
         
-        response = client.post("/api/query", json=request_data)
+        response = await client.post("/api/query", json=request_data)
         
         # Should still work, backend should handle empty queries
-        assert response.status_code == 200
-        data = response.json()
-        assert "answer" in data
-        assert "session_id" in data
+        ok_json(response, QueryResponseSchema)
     
-    def test_query_missing_query_field(self, client):
-        """Test query endpoint with missing query field"""
-        request_data = {
-            "session_id": "test_session"
-        }
-        
-        response = client.post("/api/query", json=request_data)
-        
-        # Should return validation error
-        assert response.status_code == 422
-    
-    def test_query_invalid_json(self, client):
-        """Test query endpoint with invalid JSON"""
-        response = client.post(
-            "/api/query", 
-            data="invalid json",
-            headers={"Content-Type": "application/json"}
-        )
-        
-        assert response.status_code == 422
-    
-    def test_query_rag_system_error(self, client, test_app):
+    async def test_query_rag_system_error(self, client, test_app):
         """Test query endpoint when RAG system raises exception"""
-        # Configure mock to raise exception
-        test_app.state.mock_rag_system.query.side_effect = Exception("RAG system error")
-        
-        request_data = {
-            "query": "test query"
-        }
-        
-        response = client.post("/api/query", json=request_data)
+        # Make the RAG system raise for this request only
+        with patch.object(test_app.state.mock_rag_system, "query", side_effect=Exception(RAG_ERROR.decode())):
+            response = await client.post("/api/query", json={"query": "test query"})
         
         assert response.status_code == 500
-        data = response.json()
-        assert "detail" in data
-        assert "RAG system error" in data["detail"]
-        
-        # Reset mock for other tests
-        test_app.state.mock_rag_system.query.side_effect = None
+        assert RAG_ERROR in response.content
     
-    def test_query_response_format(self, client):
+    async def test_query_response_format(self, client):
         """Test that query response follows expected format"""
         request_data = {
             "query": "What is the main topic of the first course?"
         }
         
-        response = client.post("/api/query", json=request_data)
+        response = await client.post("/api/query", json=request_data)
+        
+        # Validate response structure, including every source object
+        ok_json(response, QueryResponseSchema)
+
+@pytest.mark.api
+class TestQueryStreamEndpoint:
+    """Test cases for /api/query/stream endpoint"""
+    
+    def _read_events(self, response):
+        return [
+            json.loads(line[len("data: "):])
+            for line in response.text.splitlines()
+            if line.startswith("data: ")
+        ]
+    
+    async def test_stream_deltas_then_done(self, client):
+        """Test that deltas arrive in order followed by sources and session"""
+        response = await client.post("/api/query/stream", json={"query": "What is RAG?"})
         
         assert response.status_code == 200
-        data = response.json()
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = self._read_events(response)
+        deltas = [event["content"] for event in events if event["type"] == "delta"]
         
-        # Validate response structure
-        assert isinstance(data["answer"], str)
-        assert isinstance(data["sources"], list)
-        assert isinstance(data["session_id"], str)
+        assert "".join(deltas) == "This is a test response"
+        assert events[-1]["type"] == "done"
+        assert events[-1]["session_id"] == "test_session_123"
+        assert events[-1]["sources"][0]["display"] == "Test Course - Lesson 1"
+    
+    async def test_stream_rag_system_error(self, client, test_app):
+        """Test that errors during streaming are reported as an error event"""
+        with patch.object(test_app.state.mock_rag_system, "query_stream", side_effect=Exception("Stream failed")):
+            response = await client.post("/api/query/stream", json={"query": "What is RAG?"})
         
-        # Validate source objects
-        for source in data["sources"]:
-            assert "display" in source
-            assert "link" in source
-            assert isinstance(source["display"], str)
-            # link can be None or string
-            if source["link"] is not None:
-                assert isinstance(source["link"], str)
+        events = self._read_events(response)
+        assert events[-1] == {"type": "error", "detail": "Stream failed"}
 
 @pytest.mark.api  
 class TestCoursesEndpoint:
     """Test cases for /api/courses endpoint"""
     
-    def test_get_course_stats(self, client):
+    async def test_get_course_stats(self, client):
         """Test courses endpoint returns proper statistics"""
-        response = client.get("/api/courses")
+        response = await client.get("/api/courses")
         
-        assert response.status_code == 200
-        data = response.json()
-        
-        assert "total_courses" in data
-        assert "course_titles" in data
-        assert isinstance(data["total_courses"], int)
-        assert isinstance(data["course_titles"], list)
+        data = ok_json(response, CourseStatsSchema)
         
         # From our mock data
-        assert data["total_courses"] == 2
-        assert len(data["course_titles"]) == 2
-        assert "Building Toward Computer Use with Anthropic" in data["course_titles"]
-        assert "Introduction to RAG Systems" in data["course_titles"]
+        assert data.total_courses == 2
+        assert len(data.course_titles) == 2
+        assert "Building Toward Computer Use with Anthropic" in data.course_titles
+        assert "Introduction to RAG Systems" in data.course_titles
     
-    def test_get_course_stats_rag_system_error(self, client, test_app):
+    async def test_get_course_stats_rag_system_error(self, client, test_app):
         """Test courses endpoint when RAG system raises exception"""
-        # Configure mock to raise exception
-        test_app.state.mock_rag_system.get_course_analytics.side_effect = Exception("Analytics error")
-        
-        response = client.get("/api/courses")
+        # Make the RAG system raise for this request only
+        with patch.object(test_app.state.mock_rag_system, "get_course_analytics", side_effect=Exception(ANALYTICS_ERROR.decode())):
+            response = await client.get("/api/courses")
         
         assert response.status_code == 500
-        data = response.json()
-        assert "detail" in data
-        assert "Analytics error" in data["detail"]
-        
-        # Reset mock for other tests
-        test_app.state.mock_rag_system.get_course_analytics.side_effect = None
+        assert ANALYTICS_ERROR in response.content
     
-    def test_get_course_stats_empty_result(self, client, test_app):
+    async def test_get_course_stats_empty_result(self, client, test_app):
         """Test courses endpoint with empty course list"""
-        # Configure mock to return empty results
-        test_app.state.mock_rag_system.get_course_analytics.return_value = {
-            "total_courses": 0,
-            "course_titles": []
-        }
-        
-        response = client.get("/api/courses")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["total_courses"] == 0
-        assert data["course_titles"] == []
-        
-        # Reset mock for other tests
-        test_app.state.mock_rag_system.get_course_analytics.return_value = {
-            "total_courses": 2,
-            "course_titles": ["Building Toward Computer Use with Anthropic", "Introduction to RAG Systems"]
-        }
+        # Return empty results for this request only
+        empty = {"total_courses": 0, "course_titles": []}
+        with patch.object(test_app.state.mock_rag_system, "get_course_analytics", return_value=empty):
+            response = await client.get("/api/courses")
+        
+        data = ok_json(response, CourseStatsSchema)
+        assert data.total_courses == 0
+        assert data.course_titles == []
 
 @pytest.mark.api
 class TestRootEndpoint:
     """Test cases for / endpoint"""
     
-    def test_root_endpoint(self, client):
+    async def test_root_endpoint(self, client):
         """Test root endpoint returns proper response"""
-        response = client.get("/")
-        
-        assert response.status_code == 200
-        data = response.json()
+        response = await client.get("/")
         
-        assert "message" in data
-        assert "RAG Chatbot API - Test Mode" in data["message"]
+        data = ok_json(response, RootSchema)
+        assert "RAG Chatbot API - Test Mode" in data.message
 
 @pytest.mark.api
 class TestEndpointIntegration:
     """Integration tests for API endpoints"""
     
-    def test_query_and_courses_workflow(self, client):
+    @pytest.mark.slow
+    async def test_query_and_courses_workflow(self, client):
         """Test typical workflow: check courses, then make queries"""
         # First, get course statistics
-        courses_response = client.get("/api/courses")
-        assert courses_response.status_code == 200
-        courses_data = courses_response.json()
+        courses_data = ok_json(await client.get("/api/courses"), CourseStatsSchema)
         
         # Should have courses available
-        assert courses_data["total_courses"] > 0
-        assert len(courses_data["course_titles"]) > 0
+        assert courses_data.total_courses > 0
+        assert len(courses_data.course_titles) > 0
         
         # Then make a query about one of the courses
-        course_title = courses_data["course_titles"][0]
+        course_title = courses_data.course_titles[0]
         query_request = {
             "query": f"Tell me about {course_title}"
         }
         
-        query_response = client.post("/api/query", json=query_request)
-        assert query_response.status_code == 200
-        query_data = query_response.json()
+        query_response = await client.post("/api/query", json=query_request)
+        query_data = ok_json(query_response, QueryResponseSchema)
         
         # Should get a response with session
-        assert query_data["answer"]
-        assert query_data["session_id"]
+        assert query_data.answer
+        assert query_data.session_id
         
         # Make follow-up query with same session
         followup_request = {
             "query": "Can you tell me more?",
-            "session_id": query_data["session_id"]
+            "session_id": query_data.session_id
         }
         
-        followup_response = client.post("/api/query", json=followup_request)
-        assert followup_response.status_code == 200
-        followup_data = followup_response.json()
+        followup_response = await client.post("/api/query", json=followup_request)
+        followup_data = ok_json(followup_response, QueryResponseSchema)
         
         # Should maintain same session
-        assert followup_data["session_id"] == query_data["session_id"]
+        assert followup_data.session_id == query_data.session_id
     
-    def test_cors_headers(self, client):
+    async def test_cors_headers(self, client):
         """Test that CORS headers are properly set"""
-        response = client.options("/api/query")
-        
-        # Should have CORS headers (TestClient might not show all, but endpoint should work)
-        assert response.status_code in [200, 405]  # OPTIONS might not be explicitly handled
+        response = await client.post(
+            "/api/query",
+            json={"query": "test"},
+            headers={"Origin": "http://example.com"}
+        )
         
-        # Test actual request works (which means CORS is configured)
-        actual_response = client.post("/api/query", json={"query": "test"})
-        assert actual_response.status_code == 200
+        ok_json(response, QueryResponseSchema)
+        assert response.headers["access-control-allow-origin"] == "*"
+        assert response.headers["access-control-allow-credentials"] == "true"
 
 @pytest.mark.api
 class TestErrorHandling:
     """Test error handling across endpoints"""
     
-    def test_malformed_json_requests(self, client):
-        """Test handling of malformed JSON in requests"""
-        # Test query endpoint
-        response = client.post(
+    @pytest.mark.parametrize("request_kwargs", [
+        pytest.param({"content": "invalid json"}, id="invalid_json"),
+        pytest.param({"content": '{"query": incomplete json'}, id="incomplete_json"),
+        pytest.param({"content": ""}, id="empty_body"),
+        pytest.param({"json": {"session_id": "test_session"}}, id="missing_query_field"),
+    ])
+    async def test_invalid_query_requests(self, client, request_kwargs):
+        """Test that malformed or incomplete query bodies return validation errors"""
+        response = await client.post(
             "/api/query",
-            data='{"query": incomplete json',
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json"},
+            **request_kwargs
         )
         assert response.status_code == 422
     
-    def test_unsupported_http_methods(self, client):
+    async def test_unsupported_http_methods(self, client):
         """Test unsupported HTTP methods return proper errors"""
         # Test PUT on query endpoint
-        response = client.put("/api/query", json={"query": "test"})
+        response = await client.put("/api/query", json={"query": "test"})
         assert response.status_code == 405
         
         # Test POST on courses endpoint
-        response = client.post("/api/courses", json={"test": "data"})
+        response = await client.post("/api/courses", json={"test": "data"})
         assert response.status_code == 405
         
         # Test DELETE on root endpoint
-        response = client.delete("/")
+        response = await client.delete("/")
         assert response.status_code == 405
     
-    def test_nonexistent_endpoints(self, client):
+    async def test_nonexistent_endpoints(self, client):
         """Test that non-existent endpoints return 404"""
-        response = client.get("/api/nonexistent")
+        response = await client.get("/api/nonexistent")
         assert response.status_code == 404
         
-        response = client.post("/api/invalid")
+        response = await client.post("/api/invalid")
         assert response.status_code == 404
\ No newline at end of file
@@ -3,305 +3,177 @@ Unit tests for CourseSearchTool
 Tests the search functionality in isolation using mocked dependencies
 """
 
-import os
-import sys
-import unittest
-from unittest.mock import Mock, patch
+from typing import Any, Dict, Literal
+from unittest.mock import patch
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from search_tools import CourseSearchTool
+import pytest
+from pydantic import BaseModel, field_validator
+from search_tools import ToolManager
 from test_fixtures import (
+    SOURCES_SCHEMA,
     MockData,
-    MockVectorStore,
     assert_search_results_format,
-    print_test_section,
 )
-from vector_store import SearchResults
+
+pytestmark = pytest.mark.unit
+
+
+class ToolDefinition(BaseModel):
+    """Expected shape of the search tool's OpenAI function definition"""
+
+    name: Literal["search_course_content"]
+    description: str
+    parameters: Dict[str, Any]
+
+    @field_validator("parameters")
+    @classmethod
+    def query_is_required(cls, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """The query argument must be declared and required"""
+        if "query" not in parameters.get("properties", {}):
+            raise ValueError("query is not a declared parameter")
+        if "query" not in parameters.get("required", []):
+            raise ValueError("query is not a required parameter")
+        return parameters
+
+
+# Filter kwargs passed to execute, which must reach the store's search as-is
+FILTER_CASES = [
+    {"course_name": "Computer Use"},
+    {"lesson_number": 2},
+    {"course_name": "RAG", "lesson_number": 1},
+]
+
+# Filter kwargs and the fragments the empty-result message must mention
+ERROR_MESSAGE_CASES = [
+    ({"course_name": "NonExistent"}, ["in course 'NonExistent'"]),
+    ({"lesson_number": 99}, ["in lesson 99"]),
+    (
+        {"course_name": "NonExistent", "lesson_number": 99},
+        ["in course 'NonExistent'", "in lesson 99"],
+    ),
+]
+
+
+@pytest.fixture(autouse=True)
+def reset_sources(tool_ok, tool_empty, tool_err):
+    """Clear sources left on the session-wide tools after each test"""
+    yield
+    for tool in (tool_ok, tool_empty, tool_err):
+        tool.last_sources = []
 
 
-class TestCourseSearchTool(unittest.TestCase):
+class TestCourseSearchTool:
     """Unit tests for CourseSearchTool functionality"""
 
-    def setUp(self):
-        """Set up test environment"""
-        print_test_section("CourseSearchTool Unit Tests")
-
-    def test_tool_definition(self):
+    def test_tool_definition(self, tool_ok):
         """Test that tool definition is correctly formatted"""
-        print("\n🔍 Testing tool definition...")
-
-        mock_store = MockVectorStore()
-        tool = CourseSearchTool(mock_store)
-
-        definition = tool.get_tool_definition()
-
-        # Check required fields
-        self.assertIn("name", definition)
-        self.assertIn("description", definition)
-        self.assertIn("input_schema", definition)
-
-        # Check specific values
-        self.assertEqual(definition["name"], "search_course_content")
-        self.assertIn("query", definition["input_schema"]["properties"])
-        self.assertIn("query", definition["input_schema"]["required"])
+        # Validation fails on missing fields, a wrong name or an optional query
+        definition = ToolDefinition.model_validate(tool_ok.get_tool_definition())
 
-        print("✅ Tool definition correctly formatted")
-        print(f"   - Name: {definition['name']}")
-        print(f"   - Required params: {definition['input_schema']['required']}")
+        assert definition.name == "search_course_content"
 
-    def test_execute_with_valid_data(self):
+    def test_execute_with_valid_data(self, tool_ok):
         """Test execute method with valid data"""
-        print("\n🔍 Testing execute with valid data...")
+        result = tool_ok.execute("test query")
 
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
-
-        result = tool.execute("test query")
-
-        self.assertIsInstance(result, str)
-        self.assertGreater(len(result), 0)
         assert_search_results_format(result)
 
         # Check that sources are tracked
-        self.assertTrue(hasattr(tool, "last_sources"))
-        self.assertGreater(len(tool.last_sources), 0)
+        assert len(SOURCES_SCHEMA.validate_python(tool_ok.last_sources)) > 0
 
-        print("✅ Execute with valid data successful")
-        print(f"   - Result length: {len(result)}")
-        print(f"   - Sources tracked: {len(tool.last_sources)}")
-        print(f"   - Result preview: {result[:100]}...")
-
-    def test_execute_with_empty_results(self):
+    def test_execute_with_empty_results(self, tool_empty):
         """Test execute method when no results found"""
-        print("\n🔍 Testing execute with empty results...")
-
-        mock_store = MockVectorStore(return_data=False)
-        tool = CourseSearchTool(mock_store)
+        result = tool_empty.execute("nonexistent query")
 
-        result = tool.execute("nonexistent query")
+        assert "No relevant content found" in result
+        assert len(tool_empty.last_sources) == 0
 
-        self.assertIn("No relevant content found", result)
-        self.assertEqual(len(tool.last_sources), 0)
-
-        print("✅ Execute with empty results handled correctly")
-        print(f"   - Result: {result}")
-
-    def test_execute_with_error(self):
+    def test_execute_with_error(self, tool_err):
         """Test execute method when vector store returns error"""
-        print("\n🔍 Testing execute with error...")
-
-        mock_store = MockVectorStore(return_error=True)
-        tool = CourseSearchTool(mock_store)
-
-        result = tool.execute("test query")
-
-        self.assertIn("error", result.lower())
-
-        print("✅ Execute with error handled correctly")
-        print(f"   - Error result: {result}")
-
-    def test_execute_with_course_filter(self):
-        """Test execute method with course name filter"""
-        print("\n🔍 Testing execute with course filter...")
-
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
-
-        # Mock the search method to verify filters are passed
-        original_search = mock_store.search
-        search_calls = []
-
-        def mock_search(*args, **kwargs):
-            search_calls.append(kwargs)
-            return original_search(*args, **kwargs)
-
-        mock_store.search = mock_search
-
-        result = tool.execute("test query", course_name="Computer Use")
-
-        # Verify search was called with correct parameters
-        self.assertEqual(len(search_calls), 1)
-        self.assertEqual(search_calls[0]["course_name"], "Computer Use")
-
-        print("✅ Execute with course filter successful")
-        print(f"   - Course filter applied: {search_calls[0]['course_name']}")
-
-    def test_execute_with_lesson_filter(self):
-        """Test execute method with lesson number filter"""
-        print("\n🔍 Testing execute with lesson filter...")
-
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
-
-        # Mock the search method to verify filters are passed
-        original_search = mock_store.search
-        search_calls = []
+        result = tool_err.execute("test query")
 
-        def mock_search(*args, **kwargs):
-            search_calls.append(kwargs)
-            return original_search(*args, **kwargs)
+        assert "error" in result.lower()
 
-        mock_store.search = mock_search
+    @pytest.mark.parametrize("filters", FILTER_CASES)
+    def test_execute_with_filters(self, tool_ok, filters):
+        """Test execute method passes course and lesson filters to search"""
+        # Spy on the search method to verify filters are passed
+        with patch.object(tool_ok.store, "search", wraps=tool_ok.store.search) as spy:
+            tool_ok.execute("test query", **filters)
 
-        result = tool.execute("test query", lesson_number=2)
+        spy.assert_called_once()
+        assert {key: spy.call_args.kwargs[key] for key in filters} == filters
 
-        # Verify search was called with correct parameters
-        self.assertEqual(len(search_calls), 1)
-        self.assertEqual(search_calls[0]["lesson_number"], 2)
-
-        print("✅ Execute with lesson filter successful")
-        print(f"   - Lesson filter applied: {search_calls[0]['lesson_number']}")
-
-    def test_execute_with_both_filters(self):
-        """Test execute method with both course and lesson filters"""
-        print("\n🔍 Testing execute with both filters...")
-
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
-
-        # Mock the search method to verify filters are passed
-        original_search = mock_store.search
-        search_calls = []
-
-        def mock_search(*args, **kwargs):
-            search_calls.append(kwargs)
-            return original_search(*args, **kwargs)
-
-        mock_store.search = mock_search
-
-        result = tool.execute("test query", course_name="RAG", lesson_number=1)
-
-        # Verify search was called with correct parameters
-        self.assertEqual(len(search_calls), 1)
-        self.assertEqual(search_calls[0]["course_name"], "RAG")
-        self.assertEqual(search_calls[0]["lesson_number"], 1)
-
-        print("✅ Execute with both filters successful")
-        print(f"   - Course filter: {search_calls[0]['course_name']}")
-        print(f"   - Lesson filter: {search_calls[0]['lesson_number']}")
-
-    def test_format_results(self):
+    def test_format_results(self, tool_ok):
         """Test the _format_results method"""
-        print("\n🔍 Testing results formatting...")
-
-        mock_store = MockVectorStore()
-        tool = CourseSearchTool(mock_store)
-
-        # Create test search results
-        test_results = MockData.SAMPLE_SEARCH_RESULTS
-
-        formatted = tool._format_results(test_results)
+        formatted, sources = tool_ok._format_results(MockData.fresh_results())
 
         # Check formatting
-        self.assertIsInstance(formatted, str)
-        self.assertGreater(len(formatted), 0)
+        assert isinstance(formatted, str)
+        assert len(formatted) > 0
 
         # Check that course titles and lesson numbers are included
-        self.assertIn("Building Towards Computer Use", formatted)
-        self.assertIn("Lesson", formatted)
+        assert "Building Towards Computer Use" in formatted
+        assert "Lesson" in formatted
 
-        # Check that sources are tracked
-        self.assertGreater(len(tool.last_sources), 0)
+        # Check that sources are returned, not stored on the tool
+        assert len(sources) > 0
+        assert tool_ok.last_sources == []
 
-        print("✅ Results formatting successful")
-        print(f"   - Formatted length: {len(formatted)}")
-        print(f"   - Sources generated: {len(tool.last_sources)}")
+    def test_format_results_leaves_input_unchanged(self, tool_ok):
+        """Test that formatting does not mutate the shared sample results"""
+        results = MockData.SAMPLE_SEARCH_RESULTS
+        before = (list(results.documents), list(map(dict, results.metadata)))
 
-    def test_source_tracking(self):
-        """Test that sources are properly tracked"""
-        print("\n🔍 Testing source tracking...")
+        tool_ok._format_results(results)
 
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
+        assert (results.documents, list(map(dict, results.metadata))) == before
 
-        # Execute search
-        result = tool.execute("test query")
-
-        # Check sources
-        sources = tool.last_sources
-        self.assertIsInstance(sources, list)
-        self.assertGreater(len(sources), 0)
+    def test_source_tracking(self, tool_ok):
+        """Test that sources are properly tracked"""
+        tool_ok.execute("test query")
 
-        # Check source structure
-        first_source = sources[0]
-        self.assertIn("display", first_source)
-        self.assertIn("link", first_source)
+        # Check sources and their structure
+        sources = SOURCES_SCHEMA.validate_python(tool_ok.last_sources)
+        assert len(sources) > 0
 
-        print("✅ Source tracking successful")
-        print(f"   - Sources count: {len(sources)}")
-        print(f"   - First source: {first_source}")
+    def test_execute_with_sources_returns_call_sources(self, tool_ok):
+        """Test that each call's sources are returned alongside its result"""
+        result, sources = tool_ok.execute_with_sources("test query")
 
-    def test_source_reset(self):
-        """Test that sources can be reset"""
-        print("\n🔍 Testing source reset...")
+        assert result == tool_ok.execute("test query")
+        assert SOURCES_SCHEMA.validate_python(sources)
+        assert sources == tool_ok.last_sources
 
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
+    def test_source_reset(self, tool_ok):
+        """Test that the tool manager resets the sources of its tools"""
+        manager = ToolManager()
+        manager.register_tool(tool_ok)
 
         # Execute search to populate sources
-        tool.execute("test query")
-        initial_source_count = len(tool.last_sources)
+        manager.execute_tool("search_course_content", query="test query")
+        assert len(manager.get_last_sources()) > 0
 
         # Reset sources
-        tool.last_sources = []
-
-        self.assertEqual(len(tool.last_sources), 0)
+        manager.reset_sources()
 
-        print("✅ Source reset successful")
-        print(f"   - Initial sources: {initial_source_count}")
-        print(f"   - After reset: {len(tool.last_sources)}")
+        assert tool_ok.last_sources == []
+        assert manager.get_last_sources() == []
 
-    def test_error_message_formatting(self):
+    @pytest.mark.parametrize("filters,expected", ERROR_MESSAGE_CASES)
+    def test_error_message_formatting(self, tool_empty, filters, expected):
         """Test error message formatting with filters"""
-        print("\n🔍 Testing error message formatting...")
-
-        mock_store = MockVectorStore(return_data=False)
-        tool = CourseSearchTool(mock_store)
-
-        # Test with course filter
-        result1 = tool.execute("test query", course_name="NonExistent")
-        self.assertIn("in course 'NonExistent'", result1)
-
-        # Test with lesson filter
-        result2 = tool.execute("test query", lesson_number=99)
-        self.assertIn("in lesson 99", result2)
+        result = tool_empty.execute("test query", **filters)
 
-        # Test with both filters
-        result3 = tool.execute(
-            "test query", course_name="NonExistent", lesson_number=99
-        )
-        self.assertIn("in course 'NonExistent'", result3)
-        self.assertIn("in lesson 99", result3)
+        for fragment in expected:
+            assert fragment in result
 
-        print("✅ Error message formatting successful")
-        print(f"   - Course filter error: {result1}")
-        print(f"   - Lesson filter error: {result2}")
-        print(f"   - Both filters error: {result3}")
-
-    def test_lesson_link_integration(self):
+    def test_lesson_link_integration(self, tool_ok):
         """Test integration with lesson link retrieval"""
-        print("\n🔍 Testing lesson link integration...")
-
-        mock_store = MockVectorStore(return_data=True)
-        tool = CourseSearchTool(mock_store)
-
-        # Execute search
-        result = tool.execute("test query")
+        tool_ok.execute("test query")
 
         # Check that lesson links are attempted to be retrieved
         # (The mock will return None, but the call should be made)
-        sources = tool.last_sources
-
-        for source in sources:
-            self.assertIn("link", source)
+        for source in tool_ok.last_sources:
             # Link should be None from mock, but key should exist
-
-        print("✅ Lesson link integration tested")
-        print(f"   - Sources with link keys: {len(sources)}")
-
-
-if __name__ == "__main__":
-    # Run tests with detailed output
-    unittest.main(verbosity=2)
+            assert "link" in source
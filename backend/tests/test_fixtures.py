@@ -2,24 +2,31 @@
 Test fixtures and mock data for RAG Chatbot testing
 """
 
+import functools
 import json
 import os
-import sys
-from typing import Any, Dict, List, Optional
+import re
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
 from unittest.mock import MagicMock, Mock
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from models import Course, CourseChunk, Lesson
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel, TypeAdapter
 from vector_store import SearchResults
 
 
 class MockData:
-    """Container for mock data used across tests"""
+    """Container for mock data used across tests
+
+    The samples are shared by every test in a worker process, so tests must
+    not modify them; ``fresh_results()`` returns a copy of the search results
+    to hand to code under test.
+    """
 
     # Sample course data based on actual course structure
-    SAMPLE_COURSES = [
+    SAMPLE_COURSES = (
         Course(
             title="Building Towards Computer Use with Anthropic",
             instructor="Colt Steele",
@@ -59,10 +66,10 @@ class MockData:
                 ),
             ],
         ),
-    ]
+    )
 
     # Sample course chunks for testing
-    SAMPLE_CHUNKS = [
+    SAMPLE_CHUNKS = (
         CourseChunk(
             content="Welcome to Building Toward Computer Use with Anthropic. This course teaches you about computer automation using AI agents.",
             course_title="Building Towards Computer Use with Anthropic",
@@ -81,9 +88,9 @@ class MockData:
             lesson_number=1,
             chunk_index=0,
         ),
-    ]
+    )
 
-    # Sample search results
+    # Sample search results, typed like real ones; copy with fresh_results()
     SAMPLE_SEARCH_RESULTS = SearchResults(
         documents=[chunk.content for chunk in SAMPLE_CHUNKS],
         metadata=[
@@ -108,6 +115,43 @@ class MockData:
         error="Search error: Vector store connection failed",
     )
 
+    @classmethod
+    def fresh_results(cls) -> SearchResults:
+        """Return a copy of the sample results that callers are free to modify"""
+        shared = cls.SAMPLE_SEARCH_RESULTS
+        return SearchResults(
+            documents=list(shared.documents),
+            metadata=[dict(meta) for meta in shared.metadata],
+            distances=list(shared.distances),
+        )
+
+
+@functools.cache
+def _sample_courses_metadata() -> List[Dict[str, Any]]:
+    """Catalog metadata for the sample courses, built once and shared by all stores"""
+    metadata = []
+    for course in MockData.SAMPLE_COURSES:
+        lessons_data = []
+        for lesson in course.lessons:
+            lessons_data.append(
+                {
+                    "lesson_number": lesson.lesson_number,
+                    "lesson_title": lesson.title,
+                    "lesson_link": lesson.lesson_link,
+                }
+            )
+
+        metadata.append(
+            {
+                "title": course.title,
+                "instructor": course.instructor,
+                "course_link": course.course_link,
+                "lessons": lessons_data,
+                "lesson_count": len(course.lessons),
+            }
+        )
+    return metadata
+
 
 class MockVectorStore:
     """Mock VectorStore for testing"""
@@ -115,8 +159,8 @@ class MockVectorStore:
     def __init__(self, return_data=True, return_error=False):
         self.return_data = return_data
         self.return_error = return_error
-        self.course_catalog = Mock()
-        self.course_content = Mock()
+        # No test reaches the collections; assign a Mock where one is needed
+        self.course_catalog = self.course_content = None
 
     def search(
         self,
@@ -128,7 +172,7 @@ class MockVectorStore:
         if self.return_error:
             return MockData.ERROR_SEARCH_RESULTS
         elif self.return_data:
-            return MockData.SAMPLE_SEARCH_RESULTS
+            return MockData.fresh_results()
         else:
             return MockData.EMPTY_SEARCH_RESULTS
 
@@ -162,73 +206,111 @@ class MockVectorStore:
 
     def get_all_courses_metadata(self) -> List[Dict[str, Any]]:
         """Mock course metadata"""
-        if not self.return_data:
-            return []
-
-        metadata = []
-        for course in MockData.SAMPLE_COURSES:
-            lessons_data = []
-            for lesson in course.lessons:
-                lessons_data.append(
-                    {
-                        "lesson_number": lesson.lesson_number,
-                        "lesson_title": lesson.title,
-                        "lesson_link": lesson.lesson_link,
-                    }
-                )
-
-            metadata.append(
+        return _sample_courses_metadata() if self.return_data else []
+
+
+def _chat_completion(message: Dict[str, Any], finish_reason: str) -> ChatCompletion:
+    """Build a single-choice chat completion around an assistant message"""
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [
                 {
-                    "title": course.title,
-                    "instructor": course.instructor,
-                    "course_link": course.course_link,
-                    "lessons": lessons_data,
-                    "lesson_count": len(course.lessons),
+                    "index": 0,
+                    "message": {"role": "assistant", **message},
+                    "finish_reason": finish_reason,
                 }
+            ],
+        }
+    )
+
+
+def _text_response(text: str) -> ChatCompletion:
+    """Build a chat completion that answers with the given text"""
+    return _chat_completion({"content": text}, "stop")
+
+
+def _tool_call_response(
+    name: str, arguments: Dict[str, Any], tool_id: str = "call_123"
+) -> ChatCompletion:
+    """Build a chat completion that asks for a single function call"""
+    tool_call = {
+        "id": tool_id,
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+    return _chat_completion({"content": None, "tool_calls": [tool_call]}, "tool_calls")
+
+
+def make_openai_mock(
+    mock_openai,
+    text: str = "Mock response",
+    tool_sequence: Optional[List[Any]] = None,
+    side_effect_exception: Optional[Exception] = None,
+):
+    """Script the replies of a patched OpenAI client class and return its client
+
+    Without overrides every call returns ``text``. ``tool_sequence`` lists the
+    replies in order, where a ``(tool_name, arguments)`` tuple is a function
+    call and a string is a text reply. ``side_effect_exception`` makes every
+    call raise.
+    """
+    mock_client = mock_openai.return_value
+    create = mock_client.chat.completions.create
+    if side_effect_exception is not None:
+        create.side_effect = side_effect_exception
+    elif tool_sequence is not None:
+        create.side_effect = [
+            (
+                _tool_call_response(*step)
+                if isinstance(step, tuple)
+                else _text_response(step)
             )
-        return metadata
-
-
-class MockAnthropicClient:
-    """Mock Anthropic client for testing AI Generator"""
-
-    def __init__(self, simulate_tool_use=False, simulate_error=False):
-        self.simulate_tool_use = simulate_tool_use
-        self.simulate_error = simulate_error
-        self.messages = Mock()
-
-    class MockResponse:
-        def __init__(self, simulate_tool_use=False, simulate_error=False):
-            self.simulate_tool_use = simulate_tool_use
-            self.simulate_error = simulate_error
-
-            if simulate_error:
-                raise Exception("API Error: Authentication failed")
-
-            if simulate_tool_use:
-                self.stop_reason = "tool_use"
-                self.content = [MockAnthropicClient.MockToolUseContent()]
-            else:
-                self.stop_reason = "end_turn"
-                self.content = [MockAnthropicClient.MockTextContent()]
-
-    class MockTextContent:
-        def __init__(self):
-            self.text = "This is a mock response from Claude."
-            self.type = "text"
-
-    class MockToolUseContent:
-        def __init__(self):
-            self.type = "tool_use"
-            self.id = "tool_12345"
-            self.name = "search_course_content"
-            self.input = {"query": "test query"}
-
-    def create(self, **kwargs):
-        """Mock message creation"""
-        return MockAnthropicClient.MockResponse(
-            simulate_tool_use=self.simulate_tool_use, simulate_error=self.simulate_error
-        )
+            for step in tool_sequence
+        ]
+    else:
+        create.return_value = _text_response(text)
+    return mock_client
+
+
+# Recorded OpenAI exchanges, one JSON list of chat completions per test name
+OPENAI_FIXTURES_DIR = Path(__file__).parent / "fixtures" / "openai"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_openai_exchange(name: str) -> tuple:
+    """Load a recorded exchange once and parse it into chat completions"""
+    with open(OPENAI_FIXTURES_DIR / f"{name}.json") as f:
+        completions = json.load(f)
+    return tuple(ChatCompletion.model_validate(c) for c in completions)
+
+
+def replay_openai(mock_openai, name: str):
+    """Make a patched OpenAI client replay the exchange recorded for ``name``"""
+    mock_client = mock_openai.return_value
+    mock_client.chat.completions.create.side_effect = list(_load_openai_exchange(name))
+    return mock_client
+
+
+# Tool definitions handed out by MockToolManager; callers only read them
+_TOOL_DEFS = (
+    {
+        "name": "search_course_content",
+        "description": "Search course content",
+        "input_schema": MappingProxyType(
+            {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Search query"}
+                },
+                "required": ["query"],
+            }
+        ),
+    },
+)
 
 
 class MockToolManager:
@@ -236,26 +318,14 @@ class MockToolManager:
 
     def __init__(self, return_error=False):
         self.return_error = return_error
-        self.tools = {"search_course_content": Mock(), "get_course_outline": Mock()}
+        self.tools = {"search_course_content": None, "get_course_outline": None}
         self.last_sources = [
             {"display": "Test Course - Lesson 1", "link": "http://test.com"}
         ]
 
-    def get_tool_definitions(self) -> List[Dict[str, Any]]:
-        """Mock tool definitions"""
-        return [
-            {
-                "name": "search_course_content",
-                "description": "Search course content",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Search query"}
-                    },
-                    "required": ["query"],
-                },
-            }
-        ]
+    def get_tool_definitions(self) -> Tuple[Dict[str, Any], ...]:
+        """Mock tool definitions, shared read-only by every caller"""
+        return _TOOL_DEFS
 
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Mock tool execution"""
@@ -263,6 +333,13 @@ class MockToolManager:
             return "Tool execution failed"
         return "Mock search results from tool execution"
 
+    def execute_tool_with_sources(
+        self, tool_name: str, **kwargs
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """Mock tool execution that also reports the call's sources"""
+        result = self.execute_tool(tool_name, **kwargs)
+        return result, [] if self.return_error else list(self.last_sources)
+
     def get_last_sources(self) -> List[Dict[str, str]]:
         """Mock source retrieval"""
         return self.last_sources
@@ -275,21 +352,41 @@ class MockToolManager:
 def create_mock_config():
     """Create a mock configuration object"""
     mock_config = Mock()
-    mock_config.ANTHROPIC_API_KEY = "test-api-key"
-    mock_config.ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+    mock_config.OPENAI_API_KEY = "test-api-key"
+    mock_config.OPENAI_MODEL = "gpt-4o-mini"
+    mock_config.OPENAI_BASE_URL = "https://api.openai.com/v1"
+    mock_config.PROMPT_CACHE_CONTROL = False
     mock_config.EMBEDDING_MODEL = "all-MiniLM-L6-v2"
     mock_config.CHUNK_SIZE = 800
     mock_config.CHUNK_OVERLAP = 100
     mock_config.MAX_RESULTS = 5
     mock_config.MAX_HISTORY = 2
     mock_config.CHROMA_PATH = "./test_chroma_db"
+    # No response cache, so a repeated query can't skip its mocked exchange
+    mock_config.RESPONSE_CACHE_PATH = ""
+    mock_config.RESPONSE_CACHE_TTL = 3600
     return mock_config
 
 
+class SourceSchema(BaseModel):
+    """Shape of a source entry shown in the UI; link is required but nullable"""
+
+    display: str
+    link: Optional[str]
+
+
+SOURCES_SCHEMA = TypeAdapter(List[SourceSchema])
+
+# Each formatted search result starts with a "[Course - Lesson N]" header line
+_SEARCH_RESULT_HEADER = re.compile(r"\[[^\]\n]+\]\n")
+
+
 def assert_search_results_format(result: str):
     """Assert that search results follow expected format"""
     assert isinstance(result, str), "Search result should be a string"
-    assert len(result) > 0, "Search result should not be empty"
+    assert _SEARCH_RESULT_HEADER.match(
+        result
+    ), "Search result should start with a course header"
 
 
 def assert_course_outline_format(result: str):
@@ -302,8 +399,20 @@ def assert_course_outline_format(result: str):
     ), "Course outline should include lessons section"
 
 
+# Diagnostic output is opt-in, since captured prints still cost a write per line
+_VERBOSE = bool(os.environ.get("VERBOSE_TESTS"))
+
+
+def log_detail(message: str):
+    """Print a test diagnostic line when VERBOSE_TESTS is set"""
+    if _VERBOSE:
+        print(message)
+
+
 def print_test_section(section_name: str):
-    """Print a formatted test section header"""
+    """Print a formatted test section header when VERBOSE_TESTS is set"""
+    if not _VERBOSE:
+        return
     print(f"\n{'='*60}")
     print(f"  {section_name}")
     print(f"{'='*60}")
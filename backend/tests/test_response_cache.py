@@ -0,0 +1,66 @@
+"""
+Unit tests for ResponseCache
+Tests exact-match response caching, key derivation, and TTL expiry
+"""
+
+import unittest
+
+from response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    """Unit tests for ResponseCache functionality"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.cache = ResponseCache(":memory:", ttl_seconds=60)
+        self.sources = [{"display": "MCP Course - Lesson 1", "link": None}]
+
+    def test_miss_returns_none(self):
+        """Test that an unknown key is a cache miss"""
+        self.assertIsNone(self.cache.get(ResponseCache.make_key(query="unknown")))
+
+    def test_set_and_get(self):
+        """Test that a stored response and its sources are returned on a hit"""
+        key = ResponseCache.make_key(model="gpt-4o-mini", query="What is MCP?")
+        self.cache.set(key, "MCP is a protocol.", self.sources)
+
+        answer, sources = self.cache.get(key)
+
+        self.assertEqual(answer, "MCP is a protocol.")
+        self.assertEqual(sources, self.sources)
+
+    def test_expired_entry_is_miss(self):
+        """Test that entries past their TTL are not returned"""
+        cache = ResponseCache(":memory:", ttl_seconds=0)
+        key = ResponseCache.make_key(query="What is MCP?")
+        cache.set(key, "MCP is a protocol.", [])
+
+        self.assertIsNone(cache.get(key))
+
+    def test_key_is_canonical(self):
+        """Test that keys ignore field order but not field values"""
+        key = ResponseCache.make_key(model="gpt-4o-mini", query="What is MCP?")
+        reordered = ResponseCache.make_key(query="What is MCP?", model="gpt-4o-mini")
+        different = ResponseCache.make_key(model="gpt-4o-mini", query="What is RAG?")
+
+        self.assertEqual(key, reordered)
+        self.assertNotEqual(key, different)
+
+    def test_key_rejects_non_json_fields(self):
+        """Test that values JSON can't encode fail loudly instead of being stringified"""
+        with self.assertRaises(TypeError):
+            ResponseCache.make_key(tools={"search"})
+
+    def test_clear(self):
+        """Test that clear removes all cached responses"""
+        key = ResponseCache.make_key(query="What is MCP?")
+        self.cache.set(key, "MCP is a protocol.", [])
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get(key))
+
+
+if __name__ == "__main__":
+    # Run tests with detailed output
+    unittest.main(verbosity=2)
@@ -3,58 +3,113 @@ System diagnostic tests for RAG Chatbot system
 These tests check overall system health and identify potential configuration/data issues
 """
 
+import asyncio
+import dataclasses
+import functools
 import os
-import sys
+import pathlib
 import unittest
-from unittest.mock import Mock, patch
-
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+from unittest.mock import AsyncMock, patch
 
 from ai_generator import AIGenerator
 from config import config
 from rag_system import RAGSystem
-from test_fixtures import create_mock_config, print_test_section
-from vector_store import VectorStore
+from test_fixtures import log_detail, print_test_section
+
+# Tests that reach the real model API or ChromaDB data only run on request
+LIVE = os.getenv("RUN_LIVE_TESTS") == "1"
+
+# Course documents at the repository root, two levels above this directory
+_DOCS_PATH = str(pathlib.Path(__file__).resolve().parents[2] / "docs")
+_DOC_EXTENSIONS = (".txt", ".pdf", ".docx")
+
+# RAG systems by config identity; Config is an unhashable dataclass
+_RAG_SYSTEMS: Dict[int, RAGSystem] = {}
+
+
+def _build_rag_system(cfg) -> RAGSystem:
+    """Build the RAG system once per config; it loads the embedding model and opens ChromaDB"""
+    if id(cfg) not in _RAG_SYSTEMS:
+        # Keep diagnostic queries out of the on-disk response cache
+        _RAG_SYSTEMS[id(cfg)] = RAGSystem(
+            dataclasses.replace(cfg, RESPONSE_CACHE_PATH=":memory:")
+        )
+    return _RAG_SYSTEMS[id(cfg)]
+
+
+@functools.lru_cache(maxsize=4)
+def _analytics_cached(rag_system: RAGSystem, mtime: float) -> Dict:
+    """Course analytics for one RAG system at one ChromaDB modification time"""
+    return rag_system.get_course_analytics()
+
+
+def _course_analytics(rag_system: RAGSystem) -> Dict:
+    """Course analytics, re-queried only after the ChromaDB database file changes"""
+    try:
+        mtime = os.path.getmtime(os.path.join(config.CHROMA_PATH, "chroma.sqlite3"))
+    except FileNotFoundError:
+        mtime = 0.0
+    return _analytics_cached(rag_system, mtime)
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_exists(path: str) -> bool:
+    """os.path.exists, probed once per path for the whole diagnostic run"""
+    return os.path.exists(path)
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_listdir(path: str) -> Optional[Tuple[str, ...]]:
+    """Directory entries probed once per path; None when the directory is missing"""
+    try:
+        return tuple(os.listdir(path))
+    except FileNotFoundError:
+        return None
 
 
 class TestSystemDiagnostics(unittest.TestCase):
     """System health and diagnostic tests"""
 
-    def setUp(self):
-        """Set up test environment"""
+    @classmethod
+    def setUpClass(cls):
+        """Announce the suite and resolve the ChromaDB path every check probes"""
         print_test_section("System Diagnostics Tests")
+        cls.chroma_path = config.CHROMA_PATH
+
+    def _require_live_services(self):
+        """Skip a live test when the API key or ChromaDB data is missing"""
+        if not self._check_api_key():
+            self.skipTest("API key is missing or malformed")
+        if not self._check_chromadb():
+            self.skipTest(f"ChromaDB directory not found at {self.chroma_path}")
 
     def test_config_loaded(self):
         """Test that configuration is properly loaded"""
-        print("\n🔍 Testing configuration loading...")
+        log_detail("\n🔍 Testing configuration loading...")
 
         # Check that config object exists
         self.assertIsNotNone(config, "Config object should exist")
 
-        # Check critical configuration values
-        self.assertIsNotNone(
-            config.ANTHROPIC_API_KEY, "ANTHROPIC_API_KEY should be set"
-        )
-        self.assertNotEqual(
-            config.ANTHROPIC_API_KEY, "", "ANTHROPIC_API_KEY should not be empty"
-        )
-
-        self.assertIsNotNone(config.ANTHROPIC_MODEL, "ANTHROPIC_MODEL should be set")
+        # Check critical configuration values; the key's value is checked live
+        self.assertIsNotNone(config.OPENAI_API_KEY, "OPENAI_API_KEY should be set")
+        self.assertTrue(config.OPENAI_MODEL, "OPENAI_MODEL should be set")
         self.assertIsNotNone(config.EMBEDDING_MODEL, "EMBEDDING_MODEL should be set")
         self.assertIsNotNone(config.CHROMA_PATH, "CHROMA_PATH should be set")
 
-        print(f"✅ Configuration loaded successfully")
-        print(f"   - API Key present: {'Yes' if config.ANTHROPIC_API_KEY else 'No'}")
-        print(f"   - Model: {config.ANTHROPIC_MODEL}")
-        print(f"   - Embedding Model: {config.EMBEDDING_MODEL}")
-        print(f"   - ChromaDB Path: {config.CHROMA_PATH}")
+        log_detail("✅ Configuration loaded successfully")
+        log_detail(f"   - API Key present: {'Yes' if config.OPENAI_API_KEY else 'No'}")
+        log_detail(f"   - Model: {config.OPENAI_MODEL}")
+        log_detail(f"   - Embedding Model: {config.EMBEDDING_MODEL}")
+        log_detail(f"   - ChromaDB Path: {config.CHROMA_PATH}")
 
+    @unittest.skipUnless(LIVE, "live services disabled; set RUN_LIVE_TESTS=1")
     def test_api_key_validity(self):
         """Test if API key appears to be valid format"""
-        print("\n🔍 Testing API key validity...")
+        log_detail("\n🔍 Testing API key validity...")
 
-        api_key = config.ANTHROPIC_API_KEY
+        api_key = config.OPENAI_API_KEY
 
         # Basic format check
         if api_key:
@@ -63,71 +118,67 @@ class TestSystemDiagnostics(unittest.TestCase):
             )
             self.assertTrue(
                 api_key.startswith("sk-"),
-                "Anthropic API keys typically start with 'sk-'",
+                "OpenAI API keys typically start with 'sk-'",
             )
-            print(f"✅ API key format appears valid (length: {len(api_key)})")
+            log_detail(f"✅ API key format appears valid (length: {len(api_key)})")
         else:
-            print(f"❌ API key is missing or empty")
+            log_detail("❌ API key is missing or empty")
             self.fail("API key is required for system to function")
 
     def test_documents_exist(self):
         """Test if course documents exist in expected location"""
-        print("\n🔍 Testing document availability...")
-
-        docs_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs"
-        )
+        log_detail("\n🔍 Testing document availability...")
 
         # Check if docs directory exists
         self.assertTrue(
-            os.path.exists(docs_path),
-            f"Documents directory should exist at {docs_path}",
+            _cached_exists(_DOCS_PATH),
+            f"Documents directory should exist at {_DOCS_PATH}",
         )
 
         # Check for course files
-        if os.path.exists(docs_path):
+        if _cached_exists(_DOCS_PATH):
             files = [
                 f
-                for f in os.listdir(docs_path)
-                if f.lower().endswith((".txt", ".pdf", ".docx"))
+                for f in _cached_listdir(_DOCS_PATH)
+                if f.lower().endswith(_DOC_EXTENSIONS)
             ]
             self.assertGreater(
                 len(files), 0, "Should have at least one course document"
             )
-            print(f"✅ Found {len(files)} course documents: {files}")
+            log_detail(f"✅ Found {len(files)} course documents: {files}")
         else:
-            print(f"❌ Documents directory not found at {docs_path}")
+            log_detail(f"❌ Documents directory not found at {_DOCS_PATH}")
 
     def test_chromadb_directory(self):
         """Test ChromaDB directory existence and contents"""
-        print("\n🔍 Testing ChromaDB directory...")
+        log_detail("\n🔍 Testing ChromaDB directory...")
 
-        chroma_path = config.CHROMA_PATH
+        chroma_path = self.chroma_path
 
-        if os.path.exists(chroma_path):
-            print(f"✅ ChromaDB directory exists at {chroma_path}")
+        if _cached_exists(chroma_path):
+            log_detail(f"✅ ChromaDB directory exists at {chroma_path}")
 
             # Check for database files
-            files = os.listdir(chroma_path)
-            print(f"   - Contents: {files}")
+            files = _cached_listdir(chroma_path)
+            log_detail(f"   - Contents: {files}")
 
             # Look for SQLite database
             has_sqlite = any(f.endswith(".sqlite3") for f in files)
-            print(f"   - SQLite DB present: {has_sqlite}")
+            log_detail(f"   - SQLite DB present: {has_sqlite}")
 
             if not has_sqlite:
-                print("⚠️  No SQLite database found - vector store may be empty")
+                log_detail("⚠️  No SQLite database found - vector store may be empty")
         else:
-            print(f"❌ ChromaDB directory not found at {chroma_path}")
-            print("   This likely means no data has been loaded into the system")
+            log_detail(f"❌ ChromaDB directory not found at {chroma_path}")
+            log_detail("   This likely means no data has been loaded into the system")
 
     def test_rag_system_initialization(self):
         """Test that RAGSystem can be initialized"""
-        print("\n🔍 Testing RAG system initialization...")
+        log_detail("\n🔍 Testing RAG system initialization...")
 
         try:
-            rag_system = RAGSystem(config)
-            print("✅ RAGSystem initialized successfully")
+            rag_system = _build_rag_system(config)
+            log_detail("✅ RAGSystem initialized successfully")
 
             # Check components
             self.assertIsNotNone(
@@ -140,114 +191,119 @@ class TestSystemDiagnostics(unittest.TestCase):
                 rag_system.tool_manager, "ToolManager should be initialized"
             )
 
-            print("   - VectorStore: ✅")
-            print("   - AIGenerator: ✅")
-            print("   - ToolManager: ✅")
+            log_detail("   - VectorStore: ✅")
+            log_detail("   - AIGenerator: ✅")
+            log_detail("   - ToolManager: ✅")
 
         except Exception as e:
-            print(f"❌ RAGSystem initialization failed: {str(e)}")
+            log_detail(f"❌ RAGSystem initialization failed: {str(e)}")
             self.fail(
                 f"RAGSystem should initialize successfully, but got error: {str(e)}"
             )
 
+    @unittest.skipUnless(LIVE, "live services disabled; set RUN_LIVE_TESTS=1")
     def test_vector_store_data_loaded(self):
         """Test if vector store has data loaded"""
-        print("\n🔍 Testing vector store data...")
+        self._require_live_services()
+        log_detail("\n🔍 Testing vector store data...")
 
         try:
-            rag_system = RAGSystem(config)
+            rag_system = _build_rag_system(config)
 
             # Get course analytics
-            analytics = rag_system.get_course_analytics()
+            analytics = _course_analytics(rag_system)
             course_count = analytics.get("total_courses", 0)
             course_titles = analytics.get("course_titles", [])
 
-            print(f"   - Course count: {course_count}")
-            print(f"   - Course titles: {course_titles}")
+            log_detail(f"   - Course count: {course_count}")
+            log_detail(f"   - Course titles: {course_titles}")
 
             if course_count > 0:
-                print("✅ Vector store contains course data")
+                log_detail("✅ Vector store contains course data")
             else:
-                print("❌ Vector store appears to be empty")
-                print("   This is likely the cause of 'query failed' errors")
+                log_detail("❌ Vector store appears to be empty")
+                log_detail("   This is likely the cause of 'query failed' errors")
 
         except Exception as e:
-            print(f"❌ Error checking vector store data: {str(e)}")
+            log_detail(f"❌ Error checking vector store data: {str(e)}")
 
     def test_tools_registration(self):
         """Test that tools are properly registered"""
-        print("\n🔍 Testing tool registration...")
+        log_detail("\n🔍 Testing tool registration...")
 
         try:
-            rag_system = RAGSystem(config)
+            rag_system = _build_rag_system(config)
 
             # Check tool definitions
             tool_definitions = rag_system.tool_manager.get_tool_definitions()
             tool_names = [tool.get("name") for tool in tool_definitions]
 
-            print(f"   - Registered tools: {tool_names}")
+            log_detail(f"   - Registered tools: {tool_names}")
 
             # Check for expected tools
             expected_tools = ["search_course_content", "get_course_outline"]
             for expected_tool in expected_tools:
                 if expected_tool in tool_names:
-                    print(f"   - {expected_tool}: ✅")
+                    log_detail(f"   - {expected_tool}: ✅")
                 else:
-                    print(f"   - {expected_tool}: ❌")
+                    log_detail(f"   - {expected_tool}: ❌")
                     self.fail(f"Expected tool '{expected_tool}' not registered")
 
         except Exception as e:
-            print(f"❌ Error checking tool registration: {str(e)}")
+            log_detail(f"❌ Error checking tool registration: {str(e)}")
 
-    @patch("anthropic.Anthropic")
-    def test_ai_generator_api_connection(self, mock_anthropic):
+    @patch("openai.AsyncOpenAI")
+    def test_ai_generator_api_connection(self, mock_openai):
         """Test AI Generator can connect to API"""
-        print("\n🔍 Testing Anthropic API connection...")
-
-        # Mock successful response
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = "Test response"
-        mock_response.stop_reason = "end_turn"
-
-        mock_client.messages.create.return_value = mock_response
-        mock_anthropic.return_value = mock_client
-
-        try:
-            ai_generator = AIGenerator(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
-            response = ai_generator.generate_response("test query")
+        log_detail("\n🔍 Testing OpenAI API connection...")
+
+        # Mock successful chat completion
+        mock_response = SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    finish_reason="stop",
+                    message=SimpleNamespace(content="Test response", tool_calls=None),
+                )
+            ]
+        )
+        mock_openai.return_value.chat.completions.create = AsyncMock(
+            return_value=mock_response
+        )
 
-            self.assertIsNotNone(response, "AI Generator should return a response")
-            print("✅ AI Generator API connection test passed")
+        ai_generator = AIGenerator(
+            config.OPENAI_API_KEY, config.OPENAI_MODEL, config.OPENAI_BASE_URL
+        )
+        response = asyncio.run(ai_generator.generate_response("test query"))
 
-        except Exception as e:
-            print(f"❌ AI Generator API connection failed: {str(e)}")
+        self.assertEqual(response, "Test response")
+        log_detail("✅ AI Generator API connection test passed")
 
+    @unittest.skipUnless(LIVE, "live services disabled; set RUN_LIVE_TESTS=1")
     def test_end_to_end_simple_query(self):
         """Test a simple end-to-end query to identify failure point"""
-        print("\n🔍 Testing end-to-end simple query...")
+        self._require_live_services()
+        log_detail("\n🔍 Testing end-to-end simple query...")
 
         try:
-            rag_system = RAGSystem(config)
+            rag_system = _build_rag_system(config)
 
             # Try a simple query that should work if system is healthy
-            response, sources = rag_system.query(
-                "What courses are available?", session_id="test"
+            response, sources = asyncio.run(
+                rag_system.query("What courses are available?", session_id="test")
             )
 
             self.assertIsNotNone(response, "Response should not be None")
             self.assertIsInstance(response, str, "Response should be a string")
 
-            print(f"✅ End-to-end query successful")
-            print(f"   - Response length: {len(response)}")
-            print(f"   - Sources count: {len(sources)}")
-            print(f"   - Response preview: {response[:100]}...")
+            log_detail("✅ End-to-end query successful")
+            log_detail(f"   - Response length: {len(response)}")
+            log_detail(f"   - Sources count: {len(sources)}")
+            log_detail(f"   - Response preview: {response[:100]}...")
 
         except Exception as e:
-            print(f"❌ End-to-end query failed: {str(e)}")
-            print(f"   - This is likely the source of 'query failed' errors")
-            print(f"   - Exception type: {type(e).__name__}")
+            log_detail(f"❌ End-to-end query failed: {str(e)}")
+            log_detail("   - This is likely the source of 'query failed' errors")
+            log_detail(f"   - Exception type: {type(e).__name__}")
 
     def print_system_summary(self):
         """Print a summary of system health"""
@@ -255,16 +311,9 @@ class TestSystemDiagnostics(unittest.TestCase):
         print("  SYSTEM HEALTH SUMMARY")
         print("=" * 60)
 
-        checks = [
-            ("Configuration", self._check_config()),
-            ("API Key", self._check_api_key()),
-            ("Documents", self._check_documents()),
-            ("ChromaDB", self._check_chromadb()),
-            ("Vector Store Data", self._check_vector_data()),
-            ("Tool Registration", self._check_tools()),
-        ]
+        state = self._collect_state()
 
-        for check_name, status in checks:
+        for check_name, status in state.items():
             status_icon = "✅" if status else "❌"
             print(f"{status_icon} {check_name}")
 
@@ -275,55 +324,62 @@ class TestSystemDiagnostics(unittest.TestCase):
     def _check_config(self) -> bool:
         """Helper to check configuration"""
         try:
-            return bool(config.ANTHROPIC_API_KEY and config.ANTHROPIC_MODEL)
-        except:
+            return bool(config.OPENAI_API_KEY and config.OPENAI_MODEL)
+        except AttributeError:
             return False
 
     def _check_api_key(self) -> bool:
         """Helper to check API key"""
         try:
-            return bool(config.ANTHROPIC_API_KEY and len(config.ANTHROPIC_API_KEY) > 10)
-        except:
+            return bool(config.OPENAI_API_KEY and len(config.OPENAI_API_KEY) > 10)
+        except AttributeError:
             return False
 
     def _check_documents(self) -> bool:
         """Helper to check documents"""
         try:
-            docs_path = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs"
-            )
-            return os.path.exists(docs_path) and len(os.listdir(docs_path)) > 0
-        except:
+            return bool(_cached_listdir(_DOCS_PATH))
+        except OSError:
             return False
 
     def _check_chromadb(self) -> bool:
         """Helper to check ChromaDB"""
+        return _cached_exists(self.chroma_path)
+
+    def _collect_state(self) -> Dict[str, bool]:
+        """Run every health check in one pass, building the RAG system at most once"""
+        # The checks run before the build, which creates the ChromaDB directory
+        state = {
+            "Configuration": self._check_config(),
+            "API Key": self._check_api_key(),
+            "Documents": self._check_documents(),
+            "ChromaDB": self._check_chromadb(),
+            "Vector Store Data": False,
+            "Tool Registration": False,
+        }
+
         try:
-            return os.path.exists(config.CHROMA_PATH)
-        except:
-            return False
+            rag_system = _build_rag_system(config)
+        except Exception:
+            return state
 
-    def _check_vector_data(self) -> bool:
-        """Helper to check vector store data"""
         try:
-            rag_system = RAGSystem(config)
-            analytics = rag_system.get_course_analytics()
-            return analytics.get("total_courses", 0) > 0
-        except:
-            return False
+            analytics = _course_analytics(rag_system)
+            state["Vector Store Data"] = analytics.get("total_courses", 0) > 0
+        except Exception:
+            pass
 
-    def _check_tools(self) -> bool:
-        """Helper to check tool registration"""
         try:
-            rag_system = RAGSystem(config)
             tool_definitions = rag_system.tool_manager.get_tool_definitions()
-            return len(tool_definitions) >= 2
-        except:
-            return False
+            state["Tool Registration"] = len(tool_definitions) >= 2
+        except Exception:
+            pass
+
+        return state
 
 
 if __name__ == "__main__":
-    # Run diagnostics with detailed output
+    # Run diagnostics; set VERBOSE_TESTS=1 for per-check details
     suite = unittest.TestLoader().loadTestsFromTestCase(TestSystemDiagnostics)
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
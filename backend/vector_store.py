@@ -1,3 +1,4 @@
+import functools
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
@@ -7,7 +8,7 @@ from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
 
 
-@dataclass
+@dataclass(slots=True)
 class SearchResults:
     """Container for search results with metadata"""
 
@@ -66,6 +67,11 @@ class VectorStore:
             "course_content"
         )  # Actual course material
 
+        # Course name lookups repeat across searches; cleared when the catalog changes
+        self._lookup_course_name = functools.lru_cache(maxsize=256)(
+            self._query_course_name
+        )
+
     def _create_collection(self, name: str):
         """Create or get a ChromaDB collection"""
         return self.client.get_or_create_collection(
@@ -116,16 +122,21 @@ class VectorStore:
     def _resolve_course_name(self, course_name: str) -> Optional[str]:
         """Use vector search to find best matching course by name"""
         try:
-            results = self.course_catalog.query(query_texts=[course_name], n_results=1)
-
-            if results["documents"][0] and results["metadatas"][0]:
-                # Return the title (which is now the ID)
-                return results["metadatas"][0][0]["title"]
+            return self._lookup_course_name(course_name)
         except Exception as e:
             print(f"Error resolving course name: {e}")
 
         return None
 
+    def _query_course_name(self, course_name: str) -> Optional[str]:
+        """Query the catalog for the best matching course title; errors propagate"""
+        results = self.course_catalog.query(query_texts=[course_name], n_results=1)
+
+        if results["documents"][0] and results["metadatas"][0]:
+            # Return the title (which is now the ID)
+            return results["metadatas"][0][0]["title"]
+        return None
+
     def _build_filter(
         self, course_title: Optional[str], lesson_number: Optional[int]
     ) -> Optional[Dict]:
@@ -179,6 +190,7 @@ class VectorStore:
             ],
             ids=[course.title],
         )
+        self._lookup_course_name.cache_clear()
 
     def add_course_content(self, chunks: List[CourseChunk]):
         """Add course content chunks to the vector store"""
@@ -212,6 +224,7 @@ class VectorStore:
             self.course_content = self._create_collection("course_content")
         except Exception as e:
             print(f"Error clearing data: {e}")
+        self._lookup_course_name.cache_clear()
 
     def get_existing_course_titles(self) -> List[str]:
         """Get all existing course titles from the vector store"""